@@ -1,8 +1,51 @@
+from functools import cache
+from os import cpu_count, getenv
 from pathlib import Path
 
-from torch.cuda import is_available
-
 BASE_PATH = Path(__file__).parents[1]
 ASSETS_PATH = BASE_PATH / "assets"
 MODELS_PATH = ASSETS_PATH / "models"
-DEVICE = "cuda" if is_available() else "cpu"
+DATASETS_PATH = ASSETS_PATH / "datasets"
+CHECKPOINTS_PATH = ASSETS_PATH / "checkpoints"
+
+SERVING_MODE = getenv("SERVING_MODE", "full")
+PREDICT_ENGINE = getenv(
+    "PREDICT_ENGINE", "numpy" if SERVING_MODE == "predict" else "eager"
+)
+MODEL_REGISTRY_SIZE = int(getenv("MODEL_REGISTRY_SIZE", "8"))
+PREDICT_BATCH_MAX_WAIT_MS = float(getenv("PREDICT_BATCH_MAX_WAIT_MS", "5"))
+PREDICT_BATCH_MAX_SIZE = int(getenv("PREDICT_BATCH_MAX_SIZE", "4096"))
+PREDICT_STREAM_CHUNK_SIZE = int(getenv("PREDICT_STREAM_CHUNK_SIZE", "8192"))
+DATASET_READ_CHUNK_SIZE = int(getenv("DATASET_READ_CHUNK_SIZE", "65536"))
+DATASET_WRITE_CHUNK_SIZE = int(getenv("DATASET_WRITE_CHUNK_SIZE", "10000"))
+TRAINING_WORKERS = int(getenv("TRAINING_WORKERS", str(max(1, (cpu_count() or 1) // 4))))
+TRAINING_THREADS_PER_JOB = int(
+    getenv(
+        "TRAINING_THREADS_PER_JOB", str(max(1, (cpu_count() or 1) // TRAINING_WORKERS))
+    )
+)
+TRAINING_EVENTS_POLL_SECONDS = float(getenv("TRAINING_EVENTS_POLL_SECONDS", "1"))
+CHECKPOINT_RETENTION_DAYS = float(getenv("CHECKPOINT_RETENTION_DAYS", "7"))
+
+DATABASE_FILE = getenv("DATABASE_FILE", "database.db")
+DATABASE_READ_POOL_SIZE = int(getenv("DATABASE_READ_POOL_SIZE", "4"))
+DATABASE_WRITE_TIMEOUT_SECONDS = float(getenv("DATABASE_WRITE_TIMEOUT_SECONDS", "5"))
+SQLITE_JOURNAL_MODE = getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_BUSY_TIMEOUT_MS = int(getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+@cache
+def get_device():
+    from torch.cuda import is_available
+
+    return "cuda" if is_available() else "cpu"
+
+
+def __getattr__(name: str):
+    # torch is only imported by the code that trains or runs the torch models
+    if name == "DEVICE":
+        return get_device()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,12 +1,16 @@
 from datetime import datetime
+from typing import Literal
 from uuid import UUID
 
 from pydantic import BaseModel
 
+LoaderMode = Literal["batch", "sample"]
+
 
 class DatasetModel(BaseModel):
     id: UUID
     description: str | None
+    data_version: int
 
 
 class CreateUpdateDatasetModel(BaseModel):
@@ -28,6 +32,11 @@ class DataModel(CreateDataModel):
     dataset_id: UUID
 
 
+class DataPageModel(BaseModel):
+    data: list[DataModel]
+    next_cursor: str | None
+
+
 class UpdateDataModel(BaseModel):
     dataset_id: UUID | None
     lat: float | None
@@ -37,3 +46,23 @@ class UpdateDataModel(BaseModel):
     month: int | None
     day: int | None
     mean_temp: float | None
+
+
+class BulkInsertResult(BaseModel):
+    inserted: int
+    rejected: int
+
+
+class ColumnStatsModel(BaseModel):
+    mean: float | None
+    std: float | None
+    min: float | None
+    max: float | None
+
+
+class DatasetStatsModel(BaseModel):
+    dataset_id: UUID
+    count: int
+    stations: int
+    month_counts: list[int]
+    columns: dict[str, ColumnStatsModel]
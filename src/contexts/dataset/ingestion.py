@@ -0,0 +1,169 @@
+from asyncio import to_thread
+from json import loads
+from pathlib import Path
+from typing import Any, AsyncIterator, Literal
+
+import numpy as np
+from aiofiles import open as aopen
+from aiofiles.tempfile import TemporaryDirectory
+
+from src.contexts.dataset.tables import DATA_FIELDS
+from src.utils import iter_lines
+
+INTEGER_FIELDS = ("hour", "month", "day")
+FIELD_LIMITS = {
+    "lat": (-90.0, 90.0),
+    "long": (-180.0, 180.0),
+    "hour": (0.0, 23.0),
+    "month": (1.0, 12.0),
+    "day": (1.0, 31.0),
+}
+CONTENT_TYPES: dict[str, Literal["csv", "ndjson", "parquet"]] = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+
+
+def to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def to_array(rows: list[list[Any]]) -> np.ndarray:
+    if not rows:
+        return np.empty((0, len(DATA_FIELDS)))
+    try:
+        return np.array(rows, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array(
+            [[to_float(value) for value in row] for row in rows], dtype=np.float64
+        )
+
+
+def valid_rows(array: np.ndarray) -> np.ndarray:
+    valid = np.isfinite(array).all(axis=1)
+    for index, field in enumerate(DATA_FIELDS):
+        column = array[:, index]
+        if field in FIELD_LIMITS:
+            low, high = FIELD_LIMITS[field]
+            valid &= (column >= low) & (column <= high)
+        if field in INTEGER_FIELDS:
+            valid &= column == np.floor(column)
+    return valid
+
+
+async def iter_csv_chunks(
+    stream: AsyncIterator[bytes], chunk_size: int
+) -> AsyncIterator[tuple[np.ndarray, int]]:
+    lines = iter_lines(stream)
+    header = await anext(lines, None)
+    if header is None:
+        return
+    names = [name.strip() for name in header.decode(errors="replace").split(",")]
+    missing = [field for field in DATA_FIELDS if field not in names]
+    if missing:
+        raise ValueError(f"Missing CSV columns: {', '.join(missing)}!")
+    indexes = [names.index(field) for field in DATA_FIELDS]
+
+    rows: list[list[Any]] = []
+    malformed = 0
+    async for line in lines:
+        values = line.decode(errors="replace").split(",")
+        if len(values) != len(names):
+            malformed += 1
+        else:
+            rows.append([values[index] for index in indexes])
+        if len(rows) + malformed >= chunk_size:
+            yield to_array(rows), malformed
+            rows, malformed = [], 0
+    if rows or malformed:
+        yield to_array(rows), malformed
+
+
+async def iter_ndjson_chunks(
+    stream: AsyncIterator[bytes], chunk_size: int
+) -> AsyncIterator[tuple[np.ndarray, int]]:
+    rows: list[list[Any]] = []
+    malformed = 0
+    async for line in iter_lines(stream):
+        try:
+            record = loads(line)
+            rows.append([record.get(field) for field in DATA_FIELDS])
+        except (ValueError, AttributeError):
+            malformed += 1
+        if len(rows) + malformed >= chunk_size:
+            yield to_array(rows), malformed
+            rows, malformed = [], 0
+    if rows or malformed:
+        yield to_array(rows), malformed
+
+
+async def iter_parquet_chunks(
+    stream: AsyncIterator[bytes], chunk_size: int
+) -> AsyncIterator[tuple[np.ndarray, int]]:
+    # polars is only a dev dependency, so parquet uploads are optional
+    try:
+        from polars import Float64, col, scan_parquet
+        from polars import len as pl_len
+        from polars.exceptions import PolarsError
+    except ImportError as exc:
+        raise ValueError("Parquet uploads require polars to be installed!") from exc
+
+    # the parquet footer is at the end of the file, so it must be spooled first
+    async with TemporaryDirectory() as directory:
+        path = Path(directory) / "upload.parquet"
+        async with aopen(path, "wb") as file:
+            async for chunk in stream:
+                await file.write(chunk)
+
+        try:
+            frame = scan_parquet(path)
+            amount: int = (await to_thread(frame.select(pl_len()).collect)).item()
+            projection = frame.select(
+                col(field).cast(Float64, strict=False) for field in DATA_FIELDS
+            )
+            for offset in range(0, amount, chunk_size):
+                chunk_frame = await to_thread(
+                    projection.slice(offset, chunk_size).collect
+                )
+                yield chunk_frame.to_numpy(), 0
+        except PolarsError as exc:
+            raise ValueError(f"Invalid parquet file: {exc}") from exc
+
+
+def iter_chunks(
+    kind: Literal["csv", "ndjson", "parquet"],
+    stream: AsyncIterator[bytes],
+    chunk_size: int,
+):
+    if kind == "csv":
+        return iter_csv_chunks(stream, chunk_size)
+    if kind == "ndjson":
+        return iter_ndjson_chunks(stream, chunk_size)
+    return iter_parquet_chunks(stream, chunk_size)
+
+
+async def spool_rows(
+    kind: Literal["csv", "ndjson", "parquet"],
+    stream: AsyncIterator[bytes],
+    path: Path,
+    chunk_size: int,
+) -> tuple[np.ndarray, int]:
+    # the whole body is parsed and validated before any transaction is opened,
+    # so a slow upload never holds the write connection
+    rejected = 0
+    async with aopen(path, "wb") as file:
+        async for data, malformed in iter_chunks(kind, stream, chunk_size):
+            valid = valid_rows(data)
+            await file.write(data[valid].astype(np.float64, copy=False).tobytes())
+            rejected += malformed + int((~valid).sum())
+
+    if path.stat().st_size == 0:
+        return np.empty((0, len(DATA_FIELDS))), rejected
+    rows = np.memmap(path, dtype=np.float64, mode="r")
+    return rows.reshape(-1, len(DATA_FIELDS)), rejected
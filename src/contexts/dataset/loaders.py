@@ -0,0 +1,77 @@
+from math import ceil
+
+from torch import Tensor, as_tensor, randperm
+from torch.utils.data import DataLoader, Dataset, Subset
+
+from src.contexts.dataset.entities import LoaderMode
+
+
+class TemperatureDataset(Dataset):
+    def __init__(self, tensor: Tensor) -> None:
+        super().__init__()
+        self.data = tensor[:, :-1]
+        self.target = tensor[:, -1]
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, index: int):
+        return self.data[index], self.target[index]
+
+
+class BatchLoader:
+    def __init__(
+        self,
+        dataset: TemperatureDataset | Subset,
+        batch_size: int,
+        shuffle: bool = False,
+        device: str | None = None,
+    ):
+        indices: Tensor | None = None
+        if isinstance(dataset, Subset):
+            indices = as_tensor(dataset.indices)
+            dataset = dataset.dataset  # type: ignore
+        self.data: Tensor = dataset.data  # type: ignore
+        self.target: Tensor = dataset.target  # type: ignore
+        self.indices = indices
+        if device is not None:
+            if indices is not None:
+                self.data, self.target = self.data[indices], self.target[indices]
+                self.indices = None
+            self.data, self.target = self.data.to(device), self.target.to(device)
+
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def __len__(self):
+        return ceil(self._size() / self.batch_size)
+
+    def _size(self) -> int:
+        return self.data.shape[0] if self.indices is None else self.indices.shape[0]
+
+    def __iter__(self):
+        order = randperm(self._size()) if self.shuffle else None
+        if self.indices is not None:
+            order = self.indices if order is None else self.indices[order]
+
+        for start in range(0, self._size(), self.batch_size):
+            if order is None:
+                batch = slice(start, start + self.batch_size)
+                yield self.data[batch], self.target[batch]
+            else:
+                batch_indices = order[start : start + self.batch_size].to(
+                    self.data.device
+                )
+                yield self.data[batch_indices], self.target[batch_indices]
+
+
+def create_data_loader(
+    dataset: TemperatureDataset | Subset,
+    batch_size: int,
+    shuffle: bool = False,
+    mode: LoaderMode = "batch",
+    device: str | None = None,
+):
+    if mode == "sample":
+        return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle)
+    return BatchLoader(dataset, batch_size, shuffle, device)
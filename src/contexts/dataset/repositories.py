@@ -1,10 +1,29 @@
-from uuid import UUID
+from typing import Any, AsyncIterator
+from uuid import UUID, uuid4
 
-from sqlalchemy import delete, func, select
+import numpy as np
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from src.contexts.dataset.tables import Dataset, DatasetData
+from src.constants import DATASET_READ_CHUNK_SIZE, DATASET_WRITE_CHUNK_SIZE
+from src.contexts.dataset.tables import (
+    Dataset,
+    DatasetData,
+    DatasetStation,
+    DatasetStats,
+)
 from src.database.repositories import BaseRepo
 
+DATA_COLUMNS = (
+    DatasetData.lat,
+    DatasetData.long,
+    DatasetData.alt,
+    DatasetData.hour,
+    DatasetData.month,
+    DatasetData.day,
+    DatasetData.mean_temp,
+)
+
 
 class DatasetRepo(BaseRepo[Dataset]):
     async def list_all(self):
@@ -14,14 +33,42 @@ class DatasetRepo(BaseRepo[Dataset]):
         return await self.session.scalar(select(Dataset).where(Dataset.id == id_))
 
     async def delete(self, id_: UUID):
+        await self.session.execute(
+            delete(DatasetStats).where(DatasetStats.dataset_id == id_)
+        )
+        await self.session.execute(
+            delete(DatasetStation).where(DatasetStation.dataset_id == id_)
+        )
         await self.session.execute(delete(Dataset).where(Dataset.id == id_))
 
+    async def get_data_version(self, id_: UUID):
+        return await self.session.scalar(
+            select(Dataset.data_version).where(Dataset.id == id_)
+        )
+
+    async def bump_data_version(self, id_: UUID):
+        await self.session.execute(
+            update(Dataset)
+            .where(Dataset.id == id_)
+            .values(data_version=Dataset.data_version + 1)
+        )
+
 
 class DatasetDataRepo(BaseRepo[DatasetData]):
     async def get_all_by_dataset_id(
-        self, dataset_id: UUID, limit: int | None, offset: int | None
+        self,
+        dataset_id: UUID,
+        limit: int | None,
+        offset: int | None,
+        after: UUID | None = None,
     ):
-        query = select(DatasetData).where(DatasetData.dataset_id == dataset_id)
+        query = (
+            select(DatasetData)
+            .where(DatasetData.dataset_id == dataset_id)
+            .order_by(DatasetData.id)
+        )
+        if after is not None:
+            query = query.where(DatasetData.id > after)
         if limit:
             query = query.limit(limit)
         if offset:
@@ -29,6 +76,58 @@ class DatasetDataRepo(BaseRepo[DatasetData]):
 
         return list(await self.session.scalars(query))
 
+    async def iter_columns_by_dataset_id(
+        self,
+        dataset_id: UUID,
+        chunk_size: int = DATASET_READ_CHUNK_SIZE,
+        dtype: type[np.floating] = np.float32,
+    ) -> AsyncIterator[np.ndarray]:
+        result = await self.session.stream(
+            select(*DATA_COLUMNS)
+            .where(DatasetData.dataset_id == dataset_id)
+            .execution_options(yield_per=chunk_size)
+        )
+        async for partition in result.tuples().partitions():
+            yield np.array(partition, dtype=dtype)
+
+    async def fill_columns_by_dataset_id(self, dataset_id: UUID, out: np.ndarray):
+        filled = 0
+        async for chunk in self.iter_columns_by_dataset_id(dataset_id):
+            if filled + chunk.shape[0] > out.shape[0]:
+                raise ValueError(
+                    f"Dataset with id {dataset_id} changed while being read!"
+                )
+            out[filled : filled + chunk.shape[0]] = chunk
+            filled += chunk.shape[0]
+        return filled
+
+    async def bulk_insert(
+        self,
+        dataset_id: UUID,
+        data: np.ndarray,
+        chunk_size: int = DATASET_WRITE_CHUNK_SIZE,
+    ):
+        for start in range(0, data.shape[0], chunk_size):
+            await self.session.execute(
+                insert(DatasetData.__table__),
+                [
+                    {
+                        "id": uuid4(),
+                        "dataset_id": dataset_id,
+                        "lat": lat,
+                        "long": long,
+                        "alt": alt,
+                        "hour": int(hour),
+                        "month": int(month),
+                        "day": int(day),
+                        "mean_temp": mean_temp,
+                    }
+                    for lat, long, alt, hour, month, day, mean_temp in data[
+                        start : start + chunk_size
+                    ].tolist()
+                ],
+            )
+
     async def count_all_dataset_data(self, dataset_id: UUID):
         return await self.session.scalar(
             select(func.count(DatasetData.id)).where(
@@ -43,3 +142,139 @@ class DatasetDataRepo(BaseRepo[DatasetData]):
 
     async def delete(self, id_: UUID):
         await self.session.execute(delete(DatasetData).where(DatasetData.id == id_))
+
+
+class DatasetStatsRepo(BaseRepo[DatasetStats]):
+    async def get_by_dataset_id(self, dataset_id: UUID):
+        return await self.session.scalar(
+            select(DatasetStats).where(DatasetStats.dataset_id == dataset_id)
+        )
+
+    async def count_stations(self, dataset_id: UUID):
+        return await self.session.scalar(
+            select(func.count()).where(DatasetStation.dataset_id == dataset_id)
+        )
+
+    async def compute(self, dataset_id: UUID):
+        stats = DatasetStats.empty(dataset_id)
+        async for chunk in DatasetDataRepo(self.session).iter_columns_by_dataset_id(
+            dataset_id, dtype=np.float64
+        ):
+            stats.merge(chunk)
+
+        stations = (
+            await self.session.execute(
+                select(
+                    DatasetData.lat,
+                    DatasetData.long,
+                    DatasetData.alt,
+                    func.count().label("count"),
+                )
+                .where(DatasetData.dataset_id == dataset_id)
+                .group_by(DatasetData.lat, DatasetData.long, DatasetData.alt)
+            )
+        ).mappings()
+        return stats, [
+            {"dataset_id": dataset_id, **station} for station in stations.all()
+        ]
+
+    async def save(
+        self, stats: DatasetStats, stations: list[dict[str, Any]], data_version: int
+    ):
+        dataset_id = stats.dataset_id
+        # built from an older read, the data changed or they were built since
+        current_version = await self.session.scalar(
+            select(Dataset.data_version).where(Dataset.id == dataset_id)
+        )
+        if (
+            current_version != data_version
+            or await self.get_by_dataset_id(dataset_id) is not None
+        ):
+            return
+
+        await self.session.merge(stats)
+        await self.session.execute(
+            delete(DatasetStation).where(DatasetStation.dataset_id == dataset_id)
+        )
+        if stations:
+            await self.session.execute(insert(DatasetStation), stations)
+
+    async def get_or_build(self, dataset_id: UUID):
+        # meant for a read-only session, the rows are read on it and only the
+        # stats and stations rows are written, on a short write session
+        stats = await self.get_by_dataset_id(dataset_id)
+        if stats is not None:
+            return stats
+
+        data_version = await self.session.scalar(
+            select(Dataset.data_version).where(Dataset.id == dataset_id)
+        )
+        stats, stations = await self.compute(dataset_id)
+        if data_version is not None:
+            async with DatasetStatsRepo() as repo:
+                await repo.save(stats, stations, data_version)
+                await repo.commit()
+        # ends the read so the next statements see the saved rows
+        await self.session.commit()
+        return stats
+
+    async def update_stations(self, dataset_id: UUID, data: np.ndarray, sign: int):
+        stations, counts = np.unique(data[:, :3], axis=0, return_counts=True)
+        statement = sqlite_insert(DatasetStation)
+        await self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["dataset_id", "lat", "long", "alt"],
+                set_={"count": DatasetStation.count + statement.excluded.count},
+            ),
+            [
+                {
+                    "dataset_id": dataset_id,
+                    "lat": lat,
+                    "long": long,
+                    "alt": alt,
+                    "count": sign * count,
+                }
+                for (lat, long, alt), count in zip(stations.tolist(), counts.tolist())
+            ],
+        )
+        if sign < 0:
+            await self.session.execute(
+                delete(DatasetStation).where(
+                    DatasetStation.dataset_id == dataset_id, DatasetStation.count <= 0
+                )
+            )
+
+    async def refresh_limits(self, stats: DatasetStats):
+        limits = (
+            await self.session.execute(
+                select(
+                    *(func.min(column) for column in DATA_COLUMNS),
+                    *(func.max(column) for column in DATA_COLUMNS),
+                ).where(DatasetData.dataset_id == stats.dataset_id)
+            )
+        ).one()
+        stats.set_limits(
+            np.array(limits[: len(DATA_COLUMNS)], dtype=np.float64),
+            np.array(limits[len(DATA_COLUMNS) :], dtype=np.float64),
+        )
+
+    async def apply(
+        self,
+        dataset_id: UUID,
+        added: np.ndarray | None = None,
+        removed: np.ndarray | None = None,
+    ):
+        # a dataset without stats yet has them built from its rows on the first
+        # read, so the writes never scan the dataset
+        stats = await self.get_by_dataset_id(dataset_id)
+        if stats is None:
+            return None
+
+        if added is not None and added.shape[0]:
+            stats.merge(added)
+            await self.update_stations(dataset_id, added, 1)
+        if removed is not None and removed.shape[0]:
+            if stats.remove(removed):
+                await self.refresh_limits(stats)
+            await self.update_stations(dataset_id, removed, -1)
+        return stats
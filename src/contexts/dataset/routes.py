@@ -1,25 +1,41 @@
+from pathlib import Path
 from typing import Annotated
-from uuid import UUID
+from uuid import UUID, uuid4
 
-from fastapi import Query
+import numpy as np
+from aiofiles.tempfile import TemporaryDirectory
+from fastapi import Query, Request
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
 
+from src.constants import DATASET_WRITE_CHUNK_SIZE
 from src.contexts.dataset.entities import (
+    BulkInsertResult,
     CreateDataModel,
     CreateUpdateDatasetModel,
     DataModel,
+    DataPageModel,
     DatasetModel,
+    DatasetStatsModel,
     UpdateDataModel,
 )
-from src.contexts.dataset.repositories import DatasetDataRepo, DatasetRepo
-from src.contexts.dataset.tables import Dataset, DatasetData
+from src.contexts.dataset.ingestion import CONTENT_TYPES, spool_rows
+from src.contexts.dataset.repositories import (
+    DatasetDataRepo,
+    DatasetRepo,
+    DatasetStatsRepo,
+)
+from src.contexts.dataset.snapshots import remove_snapshots
+from src.contexts.dataset.tables import Dataset, DatasetData, DatasetStats
+from src.contexts.model.entities import Message
+from src.utils import decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/datasets", tags=["Dataset"])
 
 
 @router.get("", response_model=list[DatasetModel])
 async def get_all():
-    async with DatasetRepo() as repo:
+    async with DatasetRepo(read_only=True) as repo:
         datasets = await repo.list_all()
 
     return [dataset.to_dict() for dataset in datasets]
@@ -27,9 +43,11 @@ async def get_all():
 
 @router.post("", status_code=201, response_model=DatasetModel)
 async def create(params: CreateUpdateDatasetModel):
-    dataset = Dataset(description=params.description)
+    dataset = Dataset(id=uuid4(), description=params.description)
     async with DatasetRepo() as repo:
         repo.add(dataset)
+        # kept up to date from the first row on
+        DatasetStatsRepo(repo.session).add(DatasetStats.empty(dataset.id))
         await repo.commit()
         await repo.session.refresh(dataset)
 
@@ -55,18 +73,49 @@ async def delete(id: UUID):
     async with DatasetRepo() as repo:
         await repo.delete(id)
         await repo.commit()
+    remove_snapshots(id)
+
+
+@router.get("/{dataset_id}/stats", response_model=DatasetStatsModel)
+async def get_dataset_stats(dataset_id: UUID):
+    async with DatasetStatsRepo(read_only=True) as repo:
+        if await DatasetRepo(repo.session).get_by_id(dataset_id) is None:
+            raise ValueError(f"Dataset with id {dataset_id} not found!")
+        stats = await repo.get_or_build(dataset_id)
+        stats_dict = stats.to_dict(await repo.count_stations(dataset_id) or 0)
 
+    return stats_dict
 
-@router.get("/{dataset_id}/data", response_model=list[DataModel])
+
+@router.get(
+    "/{dataset_id}/data",
+    response_model=DataPageModel,
+    responses={400: {"model": Message}},
+)
 async def get_dataset_data(
     dataset_id: UUID,
     limit: Annotated[int, Query(le=1000.0, gt=0.0)] = 100,
-    offset: int = 0,
+    after: str | None = None,
+    offset: Annotated[int, Query(deprecated=True)] = 0,
 ):
-    async with DatasetDataRepo() as repo:
-        dataset_data_list = await repo.get_all_by_dataset_id(dataset_id, limit, offset)
-
-    return [dataset_data.to_dict() for dataset_data in dataset_data_list]
+    try:
+        after_id = decode_cursor(after) if after is not None else None
+    except ValueError as exc:
+        return JSONResponse(status_code=400, content={"message": str(exc)})
+
+    async with DatasetDataRepo(read_only=True) as repo:
+        dataset_data_list = await repo.get_all_by_dataset_id(
+            dataset_id, limit + 1, offset, after_id
+        )
+
+    next_cursor = None
+    if len(dataset_data_list) > limit:
+        dataset_data_list = dataset_data_list[:limit]
+        next_cursor = encode_cursor(dataset_data_list[-1].id)
+    return {
+        "data": [dataset_data.to_dict() for dataset_data in dataset_data_list],
+        "next_cursor": next_cursor,
+    }
 
 
 @router.post("/{dataset_id}/data", status_code=201, response_model=DataModel)
@@ -83,12 +132,75 @@ async def add_data(dataset_id: UUID, params: CreateDataModel):
     )
     async with DatasetDataRepo() as repo:
         repo.add(dataset_data)
+        await DatasetRepo(repo.session).bump_data_version(dataset_id)
+        await DatasetStatsRepo(repo.session).apply(
+            dataset_id, added=np.array([dataset_data.values()])
+        )
         await repo.commit()
         await repo.session.refresh(dataset_data)
 
     return dataset_data.to_dict()
 
 
+@router.post(
+    "/{dataset_id}/data/bulk",
+    status_code=201,
+    response_model=BulkInsertResult,
+    responses={400: {"model": Message}, 415: {"model": Message}},
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                content_type: {"schema": {"type": "string", "format": "binary"}}
+                for content_type in CONTENT_TYPES
+            },
+        }
+    },
+)
+async def add_data_bulk(dataset_id: UUID, request: Request):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    kind = CONTENT_TYPES.get(content_type)
+    if kind is None:
+        return JSONResponse(
+            status_code=415,
+            content={
+                "message": f"Unsupported content type, use one of: {', '.join(CONTENT_TYPES)}"
+            },
+        )
+
+    async with DatasetRepo(read_only=True) as repo:
+        if await repo.get_by_id(dataset_id) is None:
+            raise ValueError(f"Dataset with id {dataset_id} not found!")
+
+    inserted = 0
+    async with TemporaryDirectory() as directory:
+        try:
+            rows, rejected = await spool_rows(
+                kind,
+                request.stream(),
+                Path(directory) / "rows.bin",
+                DATASET_WRITE_CHUNK_SIZE,
+            )
+        except ValueError as exc:
+            return JSONResponse(status_code=400, content={"message": str(exc)})
+
+        # a single transaction, so a failed upload can be sent again as a whole;
+        # the stats are merged per chunk to keep the memory bounded by it
+        async with DatasetDataRepo() as repo:
+            stats_repo = DatasetStatsRepo(repo.session)
+            for start in range(0, rows.shape[0], DATASET_WRITE_CHUNK_SIZE):
+                data = np.array(rows[start : start + DATASET_WRITE_CHUNK_SIZE])
+                await repo.bulk_insert(dataset_id, data)
+                await stats_repo.apply(dataset_id, added=data)
+                inserted += data.shape[0]
+            if inserted:
+                await DatasetRepo(repo.session).bump_data_version(dataset_id)
+            await repo.commit()
+        del rows
+
+    return {"inserted": inserted, "rejected": rejected}
+
+
 @router.patch("/{dataset_id}/data/{data_id}", response_model=DataModel)
 async def update_data(dataset_id: UUID, data_id: UUID, params: UpdateDataModel):
     async with DatasetDataRepo() as repo:
@@ -96,10 +208,24 @@ async def update_data(dataset_id: UUID, data_id: UUID, params: UpdateDataModel):
         if dataset_data is None:
             raise ValueError(f"Dataset data with id {data_id} not found!")
 
+        changed_datasets = {dataset_data.dataset_id}
+        old_dataset_id, old_values = dataset_data.dataset_id, dataset_data.values()
         for key, value in params.model_dump().items():
             if value is None:
                 continue
             setattr(dataset_data, key, value)
+        changed_datasets.add(dataset_data.dataset_id)
+        dataset_repo = DatasetRepo(repo.session)
+        for changed_dataset_id in changed_datasets:
+            await dataset_repo.bump_data_version(changed_dataset_id)
+
+        stats_repo = DatasetStatsRepo(repo.session)
+        added, removed = np.array([dataset_data.values()]), np.array([old_values])
+        if old_dataset_id == dataset_data.dataset_id:
+            await stats_repo.apply(old_dataset_id, added=added, removed=removed)
+        else:
+            await stats_repo.apply(old_dataset_id, removed=removed)
+            await stats_repo.apply(dataset_data.dataset_id, added=added)
         repo.add(dataset_data)
         await repo.commit()
         await repo.session.refresh(dataset_data)
@@ -110,5 +236,13 @@ async def update_data(dataset_id: UUID, data_id: UUID, params: UpdateDataModel):
 @router.delete("/{dataset_id}/data/{data_id}", status_code=204)
 async def delete_data(dataset_id: UUID, data_id: UUID):
     async with DatasetDataRepo() as repo:
+        dataset_data = await repo.get_by_id(data_id)
+        if dataset_data is None:
+            return
         await repo.delete(data_id)
+        # the row may belong to another dataset than the one in the path
+        await DatasetRepo(repo.session).bump_data_version(dataset_data.dataset_id)
+        await DatasetStatsRepo(repo.session).apply(
+            dataset_data.dataset_id, removed=np.array([dataset_data.values()])
+        )
         await repo.commit()
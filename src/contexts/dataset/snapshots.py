@@ -0,0 +1,65 @@
+from contextlib import suppress
+from pathlib import Path
+from uuid import UUID, uuid4
+
+import numpy as np
+from torch import from_numpy
+
+from src.constants import DATASETS_PATH
+from src.contexts.dataset.loaders import TemperatureDataset
+from src.contexts.dataset.repositories import (
+    DATA_COLUMNS,
+    DatasetDataRepo,
+    DatasetRepo,
+)
+
+
+def snapshot_path(dataset_id: UUID, data_version: int) -> Path:
+    return DATASETS_PATH / f"{dataset_id}-{data_version}.npy"
+
+
+def remove_snapshots(dataset_id: UUID, keep: Path | None = None):
+    for path in DATASETS_PATH.glob(f"{dataset_id}-*.npy"):
+        if path == keep:
+            continue
+        # a snapshot still mapped by another process can't be removed on windows
+        with suppress(OSError):
+            path.unlink()
+
+
+async def build_snapshot(repo: DatasetDataRepo, dataset_id: UUID) -> tuple[Path, int]:
+    # meant for a read-only session, the version, the count and the rows are
+    # read in its transaction, so they match even during an ingest
+    data_version = await DatasetRepo(repo.session).get_data_version(dataset_id)
+    if data_version is None:
+        raise ValueError(f"No dataset found with the id {dataset_id}!")
+    path = snapshot_path(dataset_id, data_version)
+    if path.exists():
+        return path, data_version
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    amount = await repo.count_all_dataset_data(dataset_id) or 0
+    tmp_path = path.with_name(f"{path.stem}-{uuid4()}.tmp")
+    array = np.lib.format.open_memmap(
+        tmp_path, mode="w+", dtype=np.float32, shape=(amount, len(DATA_COLUMNS))
+    )
+    try:
+        filled = await repo.fill_columns_by_dataset_id(dataset_id, array)
+        if filled != amount:
+            raise ValueError(f"Dataset with id {dataset_id} changed while being read!")
+        array.flush()
+    except Exception:
+        del array
+        tmp_path.unlink()
+        raise
+    del array
+    tmp_path.replace(path)
+
+    remove_snapshots(dataset_id, keep=path)
+    return path, data_version
+
+
+def load_snapshot(path: Path) -> TemperatureDataset:
+    # copy-on-write mapping, torch gets a writable view without reading the file
+    array = np.load(path, mmap_mode="c")
+    return TemperatureDataset(from_numpy(array))
@@ -1,22 +1,45 @@
 from uuid import UUID
 
-from sqlalchemy import ForeignKey
+import numpy as np
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from src.database.tables import UUIDTable
+from src.database.tables import Base, UUIDTable
+
+DATA_FIELDS = ("lat", "long", "alt", "hour", "month", "day", "mean_temp")
+MONTH_INDEX = DATA_FIELDS.index("month")
+
+
+def convert_string_to_array(string: str):
+    return np.array(string.split(","), dtype=np.float64)
+
+
+def convert_array_to_string(array: np.ndarray):
+    return ",".join(map(str, array.tolist()))
+
+
+def count_months(data: np.ndarray):
+    months = data[:, MONTH_INDEX].astype(np.int64)
+    return np.bincount(months[(months >= 1) & (months <= 12)] - 1, minlength=12)
 
 
 class Dataset(UUIDTable):
     __tablename__ = "datasets"
     description: Mapped[str | None]
+    data_version: Mapped[int] = mapped_column(default=0, server_default="0")
     data: Mapped[list["DatasetData"]] = relationship(cascade="all,delete")
 
-    def to_dict(self) -> dict[str, UUID | str | None]:
-        return {"id": self.id, "description": self.description}
+    def to_dict(self) -> dict[str, UUID | str | int | None]:
+        return {
+            "id": self.id,
+            "description": self.description,
+            "data_version": self.data_version,
+        }
 
 
 class DatasetData(UUIDTable):
     __tablename__ = "datasets_data"
+    __table_args__ = (Index("ix_datasets_data_dataset_id_id", "dataset_id", "id"),)
 
     dataset_id: Mapped[UUID] = mapped_column(ForeignKey("datasets.id"), index=True)
 
@@ -40,3 +63,147 @@ class DatasetData(UUIDTable):
             "day": self.day,
             "mean_temp": self.mean_temp,
         }
+
+    def values(self) -> list[float]:
+        return [getattr(self, field) for field in DATA_FIELDS]
+
+
+class DatasetStats(Base):
+    __tablename__ = "datasets_stats"
+
+    dataset_id: Mapped[UUID] = mapped_column(
+        ForeignKey("datasets.id"), primary_key=True
+    )
+    count: Mapped[int] = mapped_column(default=0)
+    _means: Mapped[str]
+    _m2s: Mapped[str]
+    _mins: Mapped[str]
+    _maxs: Mapped[str]
+    _month_counts: Mapped[str]
+
+    @classmethod
+    def empty(cls, dataset_id: UUID):
+        stats = cls(dataset_id=dataset_id)
+        stats.reset()
+        return stats
+
+    @property
+    def means(self):
+        return convert_string_to_array(self._means)
+
+    @property
+    def m2s(self):
+        return convert_string_to_array(self._m2s)
+
+    @property
+    def mins(self):
+        return convert_string_to_array(self._mins)
+
+    @property
+    def maxs(self):
+        return convert_string_to_array(self._maxs)
+
+    @property
+    def month_counts(self):
+        return convert_string_to_array(self._month_counts).astype(np.int64)
+
+    def reset(self):
+        self.count = 0
+        self._means = self._m2s = convert_array_to_string(np.zeros(len(DATA_FIELDS)))
+        self._mins = convert_array_to_string(np.full(len(DATA_FIELDS), np.inf))
+        self._maxs = convert_array_to_string(np.full(len(DATA_FIELDS), -np.inf))
+        self._month_counts = convert_array_to_string(np.zeros(12, dtype=np.int64))
+
+    def set_limits(self, mins: np.ndarray, maxs: np.ndarray):
+        self._mins = convert_array_to_string(mins)
+        self._maxs = convert_array_to_string(maxs)
+
+    def merge(self, data: np.ndarray):
+        if not data.shape[0]:
+            return
+        data = data.astype(np.float64)
+        amount = data.shape[0]
+        mean = data.mean(axis=0)
+        m2 = ((data - mean) ** 2).sum(axis=0)
+
+        # chan's parallel update of the running mean and sum of squares
+        total = self.count + amount
+        delta = mean - self.means
+        self._means = convert_array_to_string(self.means + delta * amount / total)
+        self._m2s = convert_array_to_string(
+            self.m2s + m2 + delta**2 * self.count * amount / total
+        )
+        self.set_limits(
+            np.minimum(self.mins, data.min(axis=0)),
+            np.maximum(self.maxs, data.max(axis=0)),
+        )
+        self._month_counts = convert_array_to_string(
+            self.month_counts + count_months(data)
+        )
+        self.count = total
+
+    def remove(self, data: np.ndarray) -> bool:
+        if not data.shape[0]:
+            return False
+        total = self.count - data.shape[0]
+        if total <= 0:
+            self.reset()
+            return False
+        data = data.astype(np.float64)
+        amount = data.shape[0]
+        mean = data.mean(axis=0)
+        m2 = ((data - mean) ** 2).sum(axis=0)
+
+        # inverse of the merge, gives back the stats of the remaining rows
+        rest_mean = (self.count * self.means - amount * mean) / total
+        delta = mean - rest_mean
+        self._m2s = convert_array_to_string(
+            np.maximum(self.m2s - m2 - delta**2 * total * amount / self.count, 0.0)
+        )
+        self._means = convert_array_to_string(rest_mean)
+        self._month_counts = convert_array_to_string(
+            self.month_counts - count_months(data)
+        )
+        self.count = total
+
+        # the limits can't be taken back, tell when they must be read again
+        return bool(
+            ((data.min(axis=0) <= self.mins) | (data.max(axis=0) >= self.maxs)).any()
+        )
+
+    def to_dict(self, stations: int):
+        has_data = self.count > 0
+        stds = np.sqrt(self.m2s / self.count) if has_data else self.m2s
+        return {
+            "dataset_id": self.dataset_id,
+            "count": self.count,
+            "stations": stations,
+            "month_counts": self.month_counts.tolist(),
+            "columns": {
+                field: {
+                    "mean": mean if has_data else None,
+                    "std": std if has_data else None,
+                    "min": min_ if has_data else None,
+                    "max": max_ if has_data else None,
+                }
+                for field, mean, std, min_, max_ in zip(
+                    DATA_FIELDS,
+                    self.means.tolist(),
+                    stds.tolist(),
+                    self.mins.tolist(),
+                    self.maxs.tolist(),
+                )
+            },
+        }
+
+
+class DatasetStation(Base):
+    __tablename__ = "datasets_stations"
+
+    dataset_id: Mapped[UUID] = mapped_column(
+        ForeignKey("datasets.id"), primary_key=True
+    )
+    lat: Mapped[float] = mapped_column(primary_key=True)
+    long: Mapped[float] = mapped_column(primary_key=True)
+    alt: Mapped[float] = mapped_column(primary_key=True)
+    count: Mapped[int]
@@ -0,0 +1,133 @@
+from asyncio import Future, Queue, Task, get_running_loop, to_thread, wait_for
+from dataclasses import dataclass
+from logging import getLogger
+from uuid import UUID
+
+import numpy as np
+
+from src.constants import PREDICT_BATCH_MAX_SIZE, PREDICT_BATCH_MAX_WAIT_MS
+from src.contexts.model.entities import DEFAULT_ENGINE, InferenceEngine
+from src.contexts.model.registry import ModelKey, ModelNotFoundError, registry
+
+
+@dataclass
+class PendingPredict:
+    data: np.ndarray
+    future: Future[np.ndarray]
+
+
+class PredictBatcher:
+    def __init__(
+        self,
+        max_wait_ms: float = PREDICT_BATCH_MAX_WAIT_MS,
+        max_batch_size: int = PREDICT_BATCH_MAX_SIZE,
+    ):
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self._queues: dict[ModelKey, Queue[PendingPredict]] = {}
+        self._workers: dict[ModelKey, Task] = {}
+
+    async def predict(
+        self, model_id: UUID, data: np.ndarray, engine: InferenceEngine = DEFAULT_ENGINE
+    ) -> np.ndarray:
+        if data.shape[0] == 0:
+            return np.empty((0, 1), dtype=np.float32)
+
+        # each engine gets its own queue, batches only mix requests of the
+        # same model and engine
+        key = (model_id, engine)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = Queue()
+            self._workers[key] = get_running_loop().create_task(self._run(key, queue))
+
+        future: Future[np.ndarray] = get_running_loop().create_future()
+        queue.put_nowait(PendingPredict(data, future))
+        return await future
+
+    async def _run(self, key: ModelKey, queue: Queue[PendingPredict]):
+        loop = get_running_loop()
+        while True:
+            pending = [await queue.get()]
+            size = pending[0].data.shape[0]
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                if queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await wait_for(queue.get(), timeout)
+                    except TimeoutError:
+                        break
+                else:
+                    item = queue.get_nowait()
+                pending.append(item)
+                size += item.data.shape[0]
+
+            await self._flush(key, pending)
+
+            if queue.empty():
+                del self._queues[key]
+                del self._workers[key]
+                return
+
+    async def _flush(self, key: ModelKey, pending: list[PendingPredict]):
+        sizes = [item.data.shape[0] for item in pending]
+        self.requests += len(pending)
+        self.batches += 1
+        self.rows += sum(sizes)
+        self.largest_batch = max(self.largest_batch, sum(sizes))
+
+        try:
+            preds = await to_thread(
+                registry.predict,
+                key[0],
+                np.concatenate([i.data for i in pending]),
+                key[1],
+            )
+        except (ModelNotFoundError, RuntimeError, ValueError) as exc:
+            self._fail(pending, exc)
+            return
+        except Exception as exc:
+            # a bug rather than a failed prediction, the callers still get it so
+            # they don't wait forever
+            getLogger("predict").exception(f"Predict batch of {key} failed!")
+            self._fail(pending, exc)
+            return
+
+        for item, pred in zip(pending, np.split(preds, np.cumsum(sizes)[:-1])):
+            if not item.future.done():
+                item.future.set_result(pred)
+
+    def _fail(self, pending: list[PendingPredict], exc: Exception):
+        for item in pending:
+            if not item.future.done():
+                item.future.set_exception(exc)
+
+    async def close(self):
+        for worker in self._workers.values():
+            worker.cancel()
+        self._queues.clear()
+        self._workers.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "queue_depth": sum(queue.qsize() for queue in self._queues.values()),
+            "active_models": len(self._queues),
+            "requests": self.requests,
+            "batches": self.batches,
+            "rows": self.rows,
+            "largest_batch": self.largest_batch,
+            "mean_batch_requests": self.requests / self.batches if self.batches else 0,
+            "mean_batch_rows": self.rows / self.batches if self.batches else 0,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_batch_size": self.max_batch_size,
+        }
+
+
+batcher = PredictBatcher()
@@ -0,0 +1,89 @@
+import random
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
+from copy import deepcopy
+from pathlib import Path
+from time import time
+from typing import Any
+from uuid import UUID
+
+import numpy as np
+import torch
+
+from src.constants import CHECKPOINT_RETENTION_DAYS, CHECKPOINTS_PATH
+
+
+def checkpoint_path(history_id: UUID) -> Path:
+    return CHECKPOINTS_PATH / f"{history_id}.pth"
+
+
+def remove_checkpoint(history_id: UUID):
+    with suppress(FileNotFoundError):
+        checkpoint_path(history_id).unlink()
+
+
+def remove_old_checkpoints(retention_days: float = CHECKPOINT_RETENTION_DAYS):
+    # the failed and cancelled trainings can be resumed, so their checkpoints
+    # are only dropped once they weren't written to for the retention period
+    deadline = time() - retention_days * 24 * 60 * 60
+    for pattern in ("*.pth", "*.tmp"):
+        for path in CHECKPOINTS_PATH.glob(pattern):
+            with suppress(FileNotFoundError):
+                if path.stat().st_mtime < deadline:
+                    path.unlink()
+
+
+def load_checkpoint(history_id: UUID) -> dict[str, Any] | None:
+    path = checkpoint_path(history_id)
+    if not path.exists():
+        return None
+    # the optimizer, scheduler and random states aren't plain tensors, and the
+    # file is only ever written by CheckpointWriter into the local checkpoints
+    # folder, so it isn't untrusted input
+    return torch.load(path, weights_only=False)
+
+
+def capture_rng_state() -> dict[str, Any]:
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+    }
+
+
+def restore_rng_state(state: dict[str, Any]):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if state["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+class CheckpointWriter:
+    def __init__(self, path: Path, extra: dict[str, Any] | None = None):
+        self.path = path
+        self.extra = extra or {}
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="checkpoint")
+        self._pending: Future[None] | None = None
+
+    def write(self, state: dict[str, Any]):
+        # copied on the training thread, the next steps change the tensors in place
+        state = deepcopy({**self.extra, **state})
+        self.wait()
+        self._pending = self._executor.submit(self._save, state)
+
+    def _save(self, state: dict[str, Any]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        torch.save(state, tmp_path)
+        tmp_path.replace(self.path)
+
+    def wait(self):
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
@@ -0,0 +1,99 @@
+from copy import deepcopy
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+from warnings import catch_warnings, simplefilter
+
+import numpy as np
+
+from src.contexts.model.entities import InferenceEngine
+
+if TYPE_CHECKING:
+    from src.contexts.model.predictor import TemperaturePredictor
+
+
+class NumpyPredictor:
+    def __init__(self, layers: list[tuple[np.ndarray, np.ndarray]]):
+        self.layers = layers
+
+    @classmethod
+    def load(cls, path: Path):
+        with np.load(path) as weights:
+            amount = sum(1 for key in weights.files if key.endswith(".weight"))
+            # transposed once, so every call is a plain row major matmul
+            layers = [
+                (
+                    np.ascontiguousarray(weights[f"net.{2 * i}.weight"].T),
+                    weights[f"net.{2 * i}.bias"],
+                )
+                for i in range(amount)
+            ]
+        return cls(layers)
+
+    def __call__(self, data: np.ndarray) -> np.ndarray:
+        output = data.astype(np.float32, copy=False)
+        for index, (weight, bias) in enumerate(self.layers):
+            output = output @ weight
+            output += bias
+            if index < len(self.layers) - 1:
+                np.maximum(output, 0, out=output)
+        return output
+
+
+def npz_path(model_path: Path) -> Path:
+    return model_path.with_suffix(".npz")
+
+
+def export_npz(model_path: Path):
+    from torch import load
+
+    state = load(model_path, map_location="cpu", weights_only=True)
+    weights = {key: value.numpy() for key, value in state.items()}
+    path = npz_path(model_path)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as file:
+        np.savez(file, **weights)
+    tmp_path.replace(path)
+    return path
+
+
+def engine_device(engine: InferenceEngine) -> str:
+    from src.constants import DEVICE
+
+    # the quantized kernels only exist for the cpu
+    return "cpu" if engine == "int8" else DEVICE
+
+
+def build_engine(
+    model: "TemperaturePredictor", engine: InferenceEngine
+) -> Callable[[Any], Any]:
+    from torch import compile, jit, nn, qint8
+
+    if engine == "torchscript":
+        # torchscript is deprecated in favour of torch.export, but it still
+        # gives the frozen graph this engine is about
+        with catch_warnings():
+            simplefilter("ignore", FutureWarning)
+            simplefilter("ignore", DeprecationWarning)
+            return jit.freeze(jit.script(model.eval()))
+    if engine == "compile":
+        # the batch size changes on every call, so the graph is compiled once
+        # with a dynamic first dimension
+        return compile(model.eval(), dynamic=True)
+    if engine == "int8":
+        # the eager mode quantization is deprecated and goes away in torch 2.10
+        try:
+            from torch.ao.quantization import quantize_dynamic
+        except ImportError as exc:
+            raise ValueError(
+                "The int8 engine isn't available on this torch version!"
+            ) from exc
+
+        with catch_warnings():
+            simplefilter("ignore", FutureWarning)
+            simplefilter("ignore", DeprecationWarning)
+            return quantize_dynamic(
+                deepcopy(model).to("cpu").eval(), {nn.Linear}, dtype=qint8
+            )
+    if engine == "eager":
+        return model.eval()
+    raise ValueError(f'Unknown inference engine "{engine}"!')
@@ -1,7 +1,38 @@
 from datetime import datetime
+from typing import Annotated, Literal, cast, get_args
 from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+from src.constants import PREDICT_ENGINE
+from src.contexts.dataset.entities import LoaderMode
+
+SchedulerKind = Literal["plateau", "one_cycle"]
+JobStatus = Literal["queued", "running", "cancelling", "done", "failed", "cancelled"]
+SweepSearch = Literal["grid", "random"]
+SweepStatus = Literal["running", "done", "failed"]
+MAX_SWEEP_TRIALS = 64
+InferenceEngine = Literal["eager", "torchscript", "compile", "int8", "numpy"]
+
+
+def check_engine(engine: str) -> InferenceEngine:
+    engines = get_args(InferenceEngine)
+    if engine not in engines:
+        raise ValueError(
+            f'Invalid PREDICT_ENGINE "{engine}", use one of: {", ".join(engines)}!'
+        )
+    return cast(InferenceEngine, engine)
+
+
+# checked on import, so a typo stops the api from starting instead of silently
+# running another engine
+DEFAULT_ENGINE = check_engine(PREDICT_ENGINE)
+ENGINE_DESCRIPTION = (
+    "How the model is run. `int8` quantizes the linear layers for the cpu, but "
+    "as the inputs aren't normalised it can be off by more than 1 °C from "
+    "`eager` and, on a model this small, it is slower than it; check both with "
+    "the parity route before choosing it."
+)
 
 
 class Message(BaseModel):
@@ -14,6 +45,34 @@ class TrainingHistoryModel(BaseModel):
     date_end: datetime | None
     epoch_train_losses: list[float] | None
     epoch_validation_losses: list[float] | None
+    model_id: UUID | None
+    interrupted: bool
+
+
+class TrainingEpochModel(BaseModel):
+    history_id: UUID
+    epoch: int
+    date: datetime
+    train_loss: float
+    validation_loss: float
+    learning_rate: float
+    samples_per_second: float
+    data_seconds: float
+    compute_seconds: float
+    validation_seconds: float
+    checkpoint_seconds: float
+    peak_rss_mb: float | None
+
+
+class TrainingJobModel(BaseModel):
+    id: UUID
+    history_id: UUID
+    status: JobStatus
+    priority: int
+    date_created: datetime
+    date_start: datetime | None
+    date_end: datetime | None
+    error: str | None
 
 
 class TrainingParams(BaseModel):
@@ -21,6 +80,65 @@ class TrainingParams(BaseModel):
     model_id: UUID | None
     epochs: int = Field(default=20, ge=1, le=100)
     batch_size: int = Field(default=2048, ge=1, le=4096)
+    loader: LoaderMode = "batch"
+    data_on_device: bool = False
+    patience: int | None = Field(default=5, ge=1)
+    min_delta: float = Field(default=0.0, ge=0.0)
+    learning_rate: float = Field(default=1e-3, gt=0.0, le=1.0)
+    scheduler: SchedulerKind | None = None
+    plateau_patience: int = Field(default=2, ge=0)
+    hidden: int = Field(default=64, ge=1, le=1024)
+    weight_decay: float = Field(default=0.01, ge=0.0, le=1.0)
+
+
+class SweepSpace(BaseModel):
+    batch_size: list[Annotated[int, Field(ge=1, le=4096)]] = Field(
+        default=[2048], min_length=1
+    )
+    learning_rate: list[Annotated[float, Field(gt=0.0, le=1.0)]] = Field(
+        default=[1e-3], min_length=1
+    )
+    hidden: list[Annotated[int, Field(ge=1, le=1024)]] = Field(
+        default=[64], min_length=1
+    )
+    weight_decay: list[Annotated[float, Field(ge=0.0, le=1.0)]] = Field(
+        default=[0.01], min_length=1
+    )
+
+
+class SweepParams(BaseModel):
+    dataset_id: UUID
+    space: SweepSpace = SweepSpace()
+    search: SweepSearch = "grid"
+    trials: int = Field(default=8, ge=1, le=MAX_SWEEP_TRIALS)
+    seed: int | None = None
+    epochs: int = Field(default=20, ge=1, le=100)
+    patience: int | None = Field(default=5, ge=1)
+    min_delta: float = Field(default=0.0, ge=0.0)
+    scheduler: SchedulerKind | None = None
+    plateau_patience: int = Field(default=2, ge=0)
+
+
+class SweepTrialModel(BaseModel):
+    batch_size: int
+    learning_rate: float
+    hidden: int
+    weight_decay: float
+    epochs: int | None = None
+    train_loss: float | None = None
+    validation_loss: float | None = None
+    error: str | None = None
+
+
+class SweepModel(BaseModel):
+    id: UUID
+    dataset_id: UUID
+    status: SweepStatus
+    date_start: datetime
+    date_end: datetime | None
+    model_id: UUID | None
+    trials: list[SweepTrialModel]
+    error: str | None
 
 
 class PredictParams(BaseModel):
@@ -35,6 +153,59 @@ class PredictParams(BaseModel):
 class Predict(BaseModel):
     model_id: UUID
     params: list[PredictParams]
+    engine: InferenceEngine = Field(
+        default=DEFAULT_ENGINE, description=ENGINE_DESCRIPTION
+    )
+
+
+class PredictColumns(BaseModel):
+    model_id: UUID
+    engine: InferenceEngine = Field(
+        default=DEFAULT_ENGINE, description=ENGINE_DESCRIPTION
+    )
+    lat: list[float]
+    long: list[float]
+    alt: list[float]
+    hour: list[int]
+    month: list[int]
+    day: list[int]
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        lengths = {
+            len(self.lat),
+            len(self.long),
+            len(self.alt),
+            len(self.hour),
+            len(self.month),
+            len(self.day),
+        }
+        if len(lengths) > 1:
+            raise ValueError("All the columns must have the same length!")
+        return self
+
+
+class PredictColumnsResult(BaseModel):
+    mean_temp: list[float]
+
+
+class EvaluationModel(BaseModel):
+    model_id: UUID
+    dataset_id: UUID
+    data_version: int
+    date: datetime
+    count: int
+    mse: float
+    mae: float
+    mape: float
+    residual_percentiles: dict[str, float]
+
+
+class EngineParity(BaseModel):
+    engine: InferenceEngine
+    max_abs_diff: float | None
+    mean_ms: float | None
+    error: str | None
 
 
 class Model(BaseModel):
@@ -44,3 +215,24 @@ class Model(BaseModel):
 
 class UpdateModelParams(BaseModel):
     description: str | None
+
+
+class RegistryStats(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class BatcherStats(BaseModel):
+    queue_depth: int
+    active_models: int
+    requests: int
+    batches: int
+    rows: int
+    largest_batch: int
+    mean_batch_requests: float
+    mean_batch_rows: float
+    max_wait_ms: float
+    max_batch_size: int
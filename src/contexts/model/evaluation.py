@@ -0,0 +1,145 @@
+from asyncio import to_thread
+from time import perf_counter
+from typing import Any, get_args
+from uuid import UUID
+
+import numpy as np
+from torch import Generator, no_grad, randperm
+
+from src.constants import DEVICE, MODELS_PATH
+from src.contexts.dataset.loaders import TemperatureDataset
+from src.contexts.dataset.repositories import DatasetDataRepo, DatasetRepo
+from src.contexts.dataset.snapshots import build_snapshot, load_snapshot
+from src.contexts.model.entities import InferenceEngine
+from src.contexts.model.predictor import TemperaturePredictor
+from src.contexts.model.registry import registry
+from src.contexts.model.repositories import ModelEvaluationRepo
+from src.contexts.model.tables import RESIDUAL_PERCENTILES, ModelEvaluation
+
+# same floor as torchmetrics, so targets close to zero don't blow up the mape
+MAPE_EPSILON = 1.17e-06
+ENGINES: tuple[InferenceEngine, ...] = get_args(InferenceEngine)
+
+
+def evaluate(
+    model: TemperaturePredictor, dataset: TemperatureDataset, batch_size: int = 8192
+):
+    amount = len(dataset)
+    residuals = np.empty(amount, dtype=np.float32)
+    squared = absolute = percentage = 0.0
+    model.eval()
+    with no_grad():
+        for start in range(0, amount, batch_size):
+            data = dataset.data[start : start + batch_size].to(DEVICE)
+            target = dataset.target[start : start + batch_size].double()
+            residual = model(data).squeeze(1).cpu().double() - target
+            # summed per row, so a short last batch weighs as much as its rows
+            squared += residual.square().sum().item()
+            absolute += residual.abs().sum().item()
+            percentage += (
+                (residual.abs() / target.abs().clamp(min=MAPE_EPSILON)).sum().item()
+            )
+            residuals[start : start + len(residual)] = residual.numpy()
+
+    return {
+        "count": amount,
+        "mse": squared / amount,
+        "mae": absolute / amount,
+        "mape": percentage / amount,
+        "residual_percentiles": np.percentile(residuals, RESIDUAL_PERCENTILES).tolist(),
+    }
+
+
+async def evaluate_model(model_id: UUID, dataset_id: UUID, batch_size: int = 8192):
+    model_path = MODELS_PATH / f"{model_id}.pth"
+    if not model_path.exists():
+        return None
+    model_version = model_path.stat().st_mtime_ns
+
+    async with ModelEvaluationRepo(read_only=True) as repo:
+        dataset = await DatasetRepo(repo.session).get_by_id(dataset_id)
+        if dataset is None:
+            return None
+        evaluation = await repo.get(
+            model_id, dataset_id, dataset.data_version, model_version
+        )
+        if evaluation is not None:
+            return evaluation.to_dict()
+        # the results are saved under the version the rows were read at
+        snapshot, data_version = await build_snapshot(
+            DatasetDataRepo(repo.session), dataset_id
+        )
+
+    dataset_snapshot = load_snapshot(snapshot)
+    if len(dataset_snapshot) == 0:
+        raise ValueError(f"Dataset with id {dataset_id} has no data to evaluate!")
+    model = await to_thread(registry.get, model_id)
+    metrics = await to_thread(evaluate, model, dataset_snapshot, batch_size)
+
+    async with ModelEvaluationRepo() as repo:
+        # older results of this pair are stale once the data or the model change
+        await repo.delete_by_model_and_dataset(model_id, dataset_id)
+        evaluation = ModelEvaluation(
+            model_id=model_id,
+            dataset_id=dataset_id,
+            data_version=data_version,
+            model_version=model_version,
+            count=metrics["count"],
+            mse=metrics["mse"],
+            mae=metrics["mae"],
+            mape=metrics["mape"],
+        )
+        evaluation.residual_percentiles = metrics["residual_percentiles"]
+        repo.add(evaluation)
+        await repo.commit()
+        await repo.session.refresh(evaluation)
+
+    return evaluation.to_dict()
+
+
+def compare_engines(model_id: UUID, data: np.ndarray, repeats: int = 5):
+    reference = registry.predict(model_id, data, "eager")
+    results: list[dict[str, Any]] = []
+    for engine in ENGINES:
+        try:
+            # the first call builds the engine, so it is left out of the timing
+            preds = registry.predict(model_id, data, engine)
+            start = perf_counter()
+            for _ in range(repeats):
+                registry.predict(model_id, data, engine)
+            results.append(
+                {
+                    "engine": engine,
+                    "max_abs_diff": float(np.abs(preds - reference).max()),
+                    "mean_ms": (perf_counter() - start) / repeats * 1000,
+                    "error": None,
+                }
+            )
+        except (RuntimeError, ValueError) as exc:
+            results.append(
+                {
+                    "engine": engine,
+                    "max_abs_diff": None,
+                    "mean_ms": None,
+                    "error": str(exc),
+                }
+            )
+    return results
+
+
+async def check_engines(model_id: UUID, dataset_id: UUID, rows: int = 1024):
+    if not (MODELS_PATH / f"{model_id}.pth").exists():
+        return None
+
+    async with DatasetRepo(read_only=True) as repo:
+        dataset = await repo.get_by_id(dataset_id)
+        if dataset is None:
+            return None
+        snapshot, _ = await build_snapshot(DatasetDataRepo(repo.session), dataset_id)
+
+    dataset_snapshot = load_snapshot(snapshot)
+    if len(dataset_snapshot) == 0:
+        raise ValueError(f"Dataset with id {dataset_id} has no data to compare!")
+    indexes = randperm(len(dataset_snapshot), generator=Generator().manual_seed(0))
+    data = dataset_snapshot.data[indexes[:rows]].numpy()
+    return await to_thread(compare_engines, model_id, data)
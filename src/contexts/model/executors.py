@@ -1,23 +1,75 @@
+from asyncio import (
+    Condition,
+    Future,
+    Lock,
+    create_task,
+    gather,
+    get_running_loop,
+    run,
+    run_coroutine_threadsafe,
+    to_thread,
+)
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone
-from logging import Logger
+from functools import partial
+from itertools import product
+from logging import Logger, getLogger
+from math import exp, log, prod
+from multiprocessing import get_context
 from pathlib import Path
+from random import Random, getrandbits
+from time import perf_counter
+from typing import Any, Callable, Coroutine
 from uuid import UUID, uuid4
 
-from torch import nn, no_grad, optim
-from torch.utils.data import DataLoader, Subset, random_split
+from torch import Generator, default_generator, nn, no_grad, optim, set_num_threads
+from torch.utils.data import Subset, random_split
 
-from src.constants import DEVICE, MODELS_PATH
-from src.contexts.dataset import TemperatureDataset
+from src.constants import (
+    DEVICE,
+    MODELS_PATH,
+    TRAINING_THREADS_PER_JOB,
+    TRAINING_WORKERS,
+)
+from src.contexts.dataset.entities import LoaderMode
+from src.contexts.dataset.loaders import TemperatureDataset, create_data_loader
 from src.contexts.dataset.repositories import DatasetDataRepo, DatasetRepo
-from src.contexts.model import TemperaturePredictor
-from src.contexts.model.entities import TrainingParams
-from src.contexts.model.repositories import ModelRepo, TrainingHistoryRepo
-from src.contexts.model.tables import Model
+from src.contexts.dataset.snapshots import build_snapshot, load_snapshot
+from src.contexts.model.checkpoints import (
+    CheckpointWriter,
+    capture_rng_state,
+    checkpoint_path,
+    load_checkpoint,
+    remove_checkpoint,
+    remove_old_checkpoints,
+    restore_rng_state,
+)
+from src.contexts.model.engines import export_npz
+from src.contexts.model.entities import SchedulerKind, SweepParams, TrainingParams
+from src.contexts.model.predictor import TemperaturePredictor
+from src.contexts.model.registry import registry
+from src.contexts.model.repositories import (
+    ModelRepo,
+    SweepRepo,
+    TrainingEpochRepo,
+    TrainingHistoryRepo,
+    TrainingJobRepo,
+)
+from src.contexts.model.tables import Model, TrainingEpoch, TrainingJob
+from src.database import engine, read_engine
+from src.utils import peak_rss_mb, setup_logging
 
 
-def create_train_validation_datasets(data: list[dict[str, UUID | int | float]]):
-    dados = TemperatureDataset(data)
-    return random_split(dados, [0.8, 0.2])
+class TrainingCancelled(Exception):
+    pass
+
+
+def create_train_validation_datasets(
+    dataset: TemperatureDataset, seed: int | None = None
+):
+    generator = Generator().manual_seed(seed) if seed is not None else default_generator
+    return random_split(dataset, [0.8, 0.2], generator=generator)
 
 
 def train(
@@ -28,24 +80,81 @@ def train(
     logger: Logger,
     epochs: int = 20,
     batch_size: int = 2048,
+    loader: LoaderMode = "batch",
+    data_on_device: bool = False,
+    patience: int | None = None,
+    min_delta: float = 0.0,
+    learning_rate: float = 1e-3,
+    weight_decay: float = 0.01,
+    scheduler_kind: SchedulerKind | None = None,
+    plateau_patience: int = 2,
+    checkpoint_writer: CheckpointWriter | None = None,
+    checkpoint: dict[str, Any] | None = None,
+    on_epoch: Callable[[dict[str, Any]], None] | None = None,
 ):
+    if checkpoint is not None:
+        model.load_state(checkpoint["model"])
     criterion = nn.MSELoss().to(DEVICE)
-    optimizer = optim.AdamW(model.parameters())
-    train_data_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-    validation_data_loader = DataLoader(
-        validation_dataset, batch_size=batch_size, shuffle=False
+    optimizer = optim.AdamW(
+        model.parameters(), lr=learning_rate, weight_decay=weight_decay
     )
+    device = DEVICE if data_on_device else None
+    train_data_loader = create_data_loader(
+        train_dataset, batch_size, shuffle=True, mode=loader, device=device
+    )
+    validation_data_loader = create_data_loader(
+        validation_dataset, batch_size, shuffle=False, mode=loader, device=device
+    )
+    plateau_scheduler = batch_scheduler = None
+    if scheduler_kind == "plateau":
+        plateau_scheduler = optim.lr_scheduler.ReduceLROnPlateau(
+            optimizer,
+            patience=plateau_patience,
+            threshold=min_delta,
+            threshold_mode="abs",
+        )
+    elif scheduler_kind == "one_cycle":
+        batch_scheduler = optim.lr_scheduler.OneCycleLR(
+            optimizer,
+            max_lr=learning_rate,
+            epochs=epochs,
+            steps_per_epoch=len(train_data_loader),
+        )
+    scheduler = plateau_scheduler or batch_scheduler
     epoch_train_losses: list[float] = []
     epoch_validation_losses: list[float] = []
+    # the best loss is the one of the saved weights, while patience counts from
+    # the last improvement larger than min_delta
+    best_loss = patience_reference = float("inf")
+    epochs_without_improvement = 0
+    start_epoch = 0
+
+    if checkpoint is not None:
+        optimizer.load_state_dict(checkpoint["optimizer"])
+        if scheduler is not None and checkpoint["scheduler"] is not None:
+            scheduler.load_state_dict(checkpoint["scheduler"])
+        epoch_train_losses = checkpoint["epoch_train_losses"]
+        epoch_validation_losses = checkpoint["epoch_validation_losses"]
+        best_loss = checkpoint["best_loss"]
+        patience_reference = checkpoint.get("patience_reference", best_loss)
+        epochs_without_improvement = checkpoint["epochs_without_improvement"]
+        start_epoch = checkpoint["epoch"]
+        restore_rng_state(checkpoint["rng"])
+        logger.info(f"Resuming the training from epoch {start_epoch + 1}")
 
-    for e in range(epochs):
+    for e in range(start_epoch, epochs):
         model = model.train()
 
         train_losses: list[float] = []
         validation_losses: list[float] = []
+        data_seconds = compute_seconds = 0.0
+        samples = 0
 
+        step_end = perf_counter()
         for data, target in train_data_loader:
             data, target = data.to(DEVICE), target.unsqueeze(1).to(DEVICE)
+            step_start = perf_counter()
+            data_seconds += step_start - step_end
 
             optimizer.zero_grad()
             target_pred = model(data)
@@ -53,11 +162,17 @@ def train(
 
             loss.backward()
             optimizer.step()
+            if batch_scheduler is not None:
+                batch_scheduler.step()
 
             _loss = loss.detach().item()
             train_losses.append(_loss)
+            samples += data.shape[0]
+            step_end = perf_counter()
+            compute_seconds += step_end - step_start
 
         model.eval()
+        validation_start = perf_counter()
         with no_grad():
             for data, target in validation_data_loader:
                 data, target = data.to(DEVICE), target.unsqueeze(1).to(DEVICE)
@@ -68,22 +183,85 @@ def train(
                 _loss = loss.detach().item()
                 validation_losses.append(_loss)
 
+        validation_seconds = perf_counter() - validation_start
+
         epoch_train_losses.append(sum(train_losses) / len(train_losses))
         epoch_validation_losses.append(sum(validation_losses) / len(validation_losses))
+        samples_per_second = samples / max(data_seconds + compute_seconds, 1e-9)
         logger.info(
-            f"Epoch {e + 1} train loss: {epoch_train_losses[-1]:.04f}; validation loss: {epoch_validation_losses[-1]:.04f}"
+            f"Epoch {e + 1} train loss: {epoch_train_losses[-1]:.04f}; validation loss: {epoch_validation_losses[-1]:.04f}; {samples_per_second:,.0f} samples/s"
         )
+        learning_rate = optimizer.param_groups[0]["lr"]
 
-        model.save(save_path)
+        if plateau_scheduler is not None:
+            plateau_scheduler.step(epoch_validation_losses[-1])
+
+        validation_loss = epoch_validation_losses[-1]
+        if validation_loss < patience_reference - min_delta:
+            patience_reference = validation_loss
+            epochs_without_improvement = 0
+        else:
+            epochs_without_improvement += 1
+        checkpoint_start = perf_counter()
+        # only the best weights are kept, the first epoch is always saved
+        if e == 0 or validation_loss < best_loss:
+            best_loss = min(best_loss, validation_loss)
+            model.save(save_path)
+
+        if checkpoint_writer is not None:
+            checkpoint_writer.write(
+                {
+                    "epoch": e + 1,
+                    "model": model.state_dict(),
+                    "optimizer": optimizer.state_dict(),
+                    "scheduler": scheduler.state_dict() if scheduler else None,
+                    "epoch_train_losses": epoch_train_losses,
+                    "epoch_validation_losses": epoch_validation_losses,
+                    "best_loss": best_loss,
+                    "patience_reference": patience_reference,
+                    "epochs_without_improvement": epochs_without_improvement,
+                    "rng": capture_rng_state(),
+                }
+            )
+        checkpoint_seconds = perf_counter() - checkpoint_start
+
+        if on_epoch is not None:
+            on_epoch(
+                {
+                    "epoch": e + 1,
+                    "train_loss": epoch_train_losses[-1],
+                    "validation_loss": validation_loss,
+                    "learning_rate": learning_rate,
+                    "samples_per_second": samples_per_second,
+                    "data_seconds": data_seconds,
+                    "compute_seconds": compute_seconds,
+                    "validation_seconds": validation_seconds,
+                    "checkpoint_seconds": checkpoint_seconds,
+                    "peak_rss_mb": peak_rss_mb(),
+                }
+            )
+
+        if patience is not None and epochs_without_improvement >= patience:
+            logger.info(
+                f"Stopping early after {e + 1} epochs, the validation loss didn't improve by more than {min_delta} for {patience} epochs; best: {best_loss:.04f}"
+            )
+            break
 
     return epoch_train_losses, epoch_validation_losses
 
 
-async def train_model(logger: Logger, training_params: TrainingParams):
-    async with TrainingHistoryRepo() as training_history_repo:
-        history = await training_history_repo.get_ongoing()
+async def train_model(
+    logger: Logger,
+    training_params: TrainingParams,
+    history_id: UUID,
+    job_id: UUID | None = None,
+):
+    # everything read before the training goes through a read-only session, so
+    # the write connection is only taken by the statements that write
+    async with TrainingHistoryRepo(read_only=True) as training_history_repo:
+        history = await training_history_repo.get_by_id(history_id)
         if history is None:
-            return
+            raise ValueError(f"No training history found with the id {history_id}!")
 
         dataset_repo = DatasetRepo(training_history_repo.session)
         dataset_data_repo = DatasetDataRepo(training_history_repo.session)
@@ -93,44 +271,440 @@ async def train_model(logger: Logger, training_params: TrainingParams):
                 f"No dataset found with the id {training_params.dataset_id}!"
             )
 
-        dataset_data_list = await dataset_data_repo.get_all_by_dataset_id(
-            dataset_instance.id, limit=None, offset=None
+        snapshot, data_version = await build_snapshot(
+            dataset_data_repo, dataset_instance.id
         )
-        data = [dataset_data.to_dict() for dataset_data in dataset_data_list]
+        checkpoint = load_checkpoint(history_id)
+        if checkpoint is not None and checkpoint["data_version"] != data_version:
+            # it can never be resumed from again
+            remove_checkpoint(history_id)
+            raise ValueError(
+                f"The dataset with the id {dataset_instance.id} changed since the training was interrupted!"
+            )
+        split_seed = checkpoint["split_seed"] if checkpoint else getrandbits(62)
 
-        train_dataset, validation_dataset = create_train_validation_datasets(data)
-        model = TemperaturePredictor().to(DEVICE)
+        base_model = None
+        if training_params.model_id is not None and checkpoint is None:
+            model_repo = ModelRepo(training_history_repo.session)
+            base_model = await model_repo.get_by_id(training_params.model_id)
 
-        model_repo = ModelRepo(training_history_repo.session)
-        if training_params.model_id is not None:
-            model_instance = await model_repo.get_by_id(training_params.model_id)
-            if model_instance:
-                model.load(MODELS_PATH / f"{model_instance.id}.pth")
+    train_dataset, validation_dataset = create_train_validation_datasets(
+        load_snapshot(snapshot), split_seed
+    )
+    model = TemperaturePredictor(training_params.hidden).to(DEVICE)
+    if base_model is not None:
+        model.load(MODELS_PATH / f"{base_model.id}.pth")
 
-        model_instance = Model(id=uuid4())
+    model_id = history.model_id or uuid4()
+    checkpoint_writer = CheckpointWriter(
+        checkpoint_path(history_id),
+        {"data_version": data_version, "split_seed": split_seed},
+    )
 
-        start = datetime.now(timezone.utc)
-        logger.info(
-            f"Starting training at [green]{start.strftime('%d/%m/%Y, %H:%M:%S')}[/]",
-            extra={"markup": True},
+    # epochs recorded after the last checkpoint are trained again
+    async with TrainingEpochRepo() as epoch_repo:
+        await epoch_repo.delete_after(
+            history_id, checkpoint["epoch"] if checkpoint else 0
         )
-        train_loss, validation_loss = train(
+        await epoch_repo.commit()
+    loop = get_running_loop()
+
+    async def save_epoch(metrics: dict[str, Any]):
+        async with TrainingEpochRepo() as epoch_repo:
+            epoch_repo.add(TrainingEpoch(history_id=history_id, **metrics))
+            await epoch_repo.commit()
+        if job_id is not None:
+            async with TrainingJobRepo(read_only=True) as job_repo:
+                job = await job_repo.get_by_id(job_id)
+            if job is not None and job.status == "cancelling":
+                raise TrainingCancelled(f"Training {history_id} was cancelled!")
+
+    def on_epoch(metrics: dict[str, Any]):
+        run_coroutine_threadsafe(save_epoch(metrics), loop).result()
+
+    start = datetime.now(timezone.utc)
+    logger.info(
+        f"Starting training at [green]{start.strftime('%d/%m/%Y, %H:%M:%S')}[/]",
+        extra={"markup": True},
+    )
+    try:
+        train_loss, validation_loss = await to_thread(
+            train,
             model,
             train_dataset,
             validation_dataset,
-            MODELS_PATH / f"{model_instance.id}.pth",
+            MODELS_PATH / f"{model_id}.pth",
             logger,
             training_params.epochs,
             training_params.batch_size,
+            training_params.loader,
+            training_params.data_on_device,
+            patience=training_params.patience,
+            min_delta=training_params.min_delta,
+            learning_rate=training_params.learning_rate,
+            weight_decay=training_params.weight_decay,
+            scheduler_kind=training_params.scheduler,
+            plateau_patience=training_params.plateau_patience,
+            checkpoint_writer=checkpoint_writer,
+            checkpoint=checkpoint,
+            on_epoch=on_epoch,
         )
-        end = datetime.now(timezone.utc)
-        logger.info(
-            f"Training finished at [green]{end.strftime('%d/%m/%Y, %H:%M:%S')}[/]",
-            extra={"markup": True},
+    finally:
+        checkpoint_writer.close()
+    end = datetime.now(timezone.utc)
+    logger.info(
+        f"Training finished at [green]{end.strftime('%d/%m/%Y, %H:%M:%S')}[/]",
+        extra={"markup": True},
+    )
+    export_npz(MODELS_PATH / f"{model_id}.pth")
+
+    async with TrainingHistoryRepo() as training_history_repo:
+        history = await training_history_repo.get_by_id(history_id)
+        if history is not None:
+            history.finish(train_loss, validation_loss)
+        ModelRepo(training_history_repo.session).add(Model(id=model_id))
+        await training_history_repo.commit()
+    remove_checkpoint(history_id)
+    return model_id
+
+
+async def _train_in_worker(
+    training_params: TrainingParams, history_id: UUID, job_id: UUID
+):
+    try:
+        return await train_model(
+            getLogger("training"), training_params, history_id, job_id
         )
-        history.finish(train_loss, validation_loss)
+    finally:
+        # the aiosqlite threads of the worker would keep it alive at shutdown
+        await engine.dispose()
+        await read_engine.dispose()
 
-        training_history_repo.add(history)
-        model_repo.add(model_instance)
 
-        await training_history_repo.commit()
+def run_training(training_params: TrainingParams, history_id: UUID, job_id: UUID):
+    set_num_threads(TRAINING_THREADS_PER_JOB)
+    return run(_train_in_worker(training_params, history_id, job_id))
+
+
+def count_trials(params: SweepParams) -> int:
+    if params.search == "random":
+        return params.trials
+    space = params.space
+    return prod(
+        map(
+            len,
+            (space.batch_size, space.learning_rate, space.hidden, space.weight_decay),
+        )
+    )
+
+
+def sample_trials(params: SweepParams) -> list[dict[str, Any]]:
+    space = params.space
+    if params.search == "grid":
+        return [
+            {
+                "batch_size": batch_size,
+                "learning_rate": learning_rate,
+                "hidden": hidden,
+                "weight_decay": weight_decay,
+            }
+            for batch_size, learning_rate, hidden, weight_decay in product(
+                space.batch_size, space.learning_rate, space.hidden, space.weight_decay
+            )
+        ]
+
+    # the learning rate is sampled on a log scale between the given bounds
+    random = Random(params.seed)
+    low_lr, high_lr = log(min(space.learning_rate)), log(max(space.learning_rate))
+    return [
+        {
+            "batch_size": random.choice(space.batch_size),
+            "learning_rate": exp(random.uniform(low_lr, high_lr)),
+            "hidden": random.choice(space.hidden),
+            "weight_decay": random.uniform(
+                min(space.weight_decay), max(space.weight_decay)
+            ),
+        }
+        for _ in range(params.trials)
+    ]
+
+
+def trial_path(sweep_id: UUID, index: int) -> Path:
+    return MODELS_PATH / f"{sweep_id}-{index}.trial"
+
+
+def remove_trials(sweep_id: UUID | None = None):
+    for path in MODELS_PATH.glob(f"{sweep_id or '*'}-*.trial"):
+        path.unlink(missing_ok=True)
+
+
+def run_sweep_trial(
+    snapshot: Path, split_seed: int, training_params: TrainingParams, save_path: Path
+):
+    set_num_threads(TRAINING_THREADS_PER_JOB)
+    # every trial maps the same snapshot file, so the pages are shared between
+    # the workers and all of them see the same split
+    train_dataset, validation_dataset = create_train_validation_datasets(
+        load_snapshot(snapshot), split_seed
+    )
+    model = TemperaturePredictor(training_params.hidden).to(DEVICE)
+    return train(
+        model,
+        train_dataset,
+        validation_dataset,
+        save_path,
+        getLogger("training"),
+        training_params.epochs,
+        training_params.batch_size,
+        training_params.loader,
+        training_params.data_on_device,
+        patience=training_params.patience,
+        min_delta=training_params.min_delta,
+        learning_rate=training_params.learning_rate,
+        weight_decay=training_params.weight_decay,
+        scheduler_kind=training_params.scheduler,
+        plateau_patience=training_params.plateau_patience,
+    )
+
+
+class TrainingRunner:
+    def __init__(self, max_workers: int = TRAINING_WORKERS):
+        self.max_workers = max_workers
+        self._pool: ProcessPoolExecutor | None = None
+        self._tasks: set[Future] = set()
+        self._lock = Lock()
+        # the sweep trials share the worker slots with the jobs, they wait on
+        # this until a slot is free
+        self._slots = Condition(self._lock)
+        self._running_trials = 0
+
+    def _spawn(self, coro: Coroutine[Any, Any, Any]):
+        task = create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def enqueue(self, history_id: UUID, priority: int = 0):
+        async with TrainingJobRepo() as repo:
+            job = TrainingJob(history_id=history_id, priority=priority)
+            repo.add(job)
+            await repo.commit()
+            await repo.session.refresh(job)
+        self._spawn(self.dispatch())
+        return job
+
+    async def dispatch(self):
+        # one dispatch at a time, so no job is started twice
+        async with self._lock, TrainingJobRepo(write_timeout=None) as repo:
+            history_repo = TrainingHistoryRepo(repo.session)
+            running = (await repo.count_running() or 0) + self._running_trials
+            while running < self.max_workers:
+                job = await repo.get_next_queued()
+                if job is None:
+                    break
+                history = await history_repo.get_by_id(job.history_id)
+                if history is None or history.params is None:
+                    job.finish("failed", "The training can't be started!")
+                    await repo.commit()
+                    continue
+
+                job_id, history_id = job.id, history.id
+                params = TrainingParams.model_validate_json(history.params)
+                job.status = "running"
+                job.date_start = datetime.now(timezone.utc)
+                history.interrupted = False
+                await repo.commit()
+
+                self.submit(params, history_id, job_id)
+                running += 1
+            self._slots.notify_all()
+
+    async def _acquire_slot(self):
+        async with self._slots:
+            while True:
+                async with TrainingJobRepo(read_only=True) as repo:
+                    running = await repo.count_running() or 0
+                if running + self._running_trials < self.max_workers:
+                    self._running_trials += 1
+                    return
+                await self._slots.wait()
+
+    async def _release_slot(self):
+        async with self._slots:
+            self._running_trials -= 1
+            self._slots.notify_all()
+        await self.dispatch()
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                self.max_workers,
+                mp_context=get_context("spawn"),
+                initializer=setup_logging,
+            )
+        return self._pool
+
+    def submit(self, training_params: TrainingParams, history_id: UUID, job_id: UUID):
+        task = get_running_loop().run_in_executor(
+            self._get_pool(), run_training, training_params, history_id, job_id
+        )
+        self._tasks.add(task)
+        task.add_done_callback(partial(self._on_done, history_id, job_id))
+        return task
+
+    def _on_done(self, history_id: UUID, job_id: UUID, task: Future[UUID]):
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if isinstance(exc, TrainingCancelled):
+            getLogger("training").info(f"Training {history_id} cancelled")
+            self._spawn(self._finish(history_id, job_id, "cancelled"))
+        elif exc is not None:
+            getLogger("training").error("Training failed!", exc_info=exc)
+            if isinstance(exc, BrokenProcessPool):
+                self._pool = None
+            self._spawn(self._finish(history_id, job_id, "failed", str(exc)))
+        else:
+            registry.invalidate(task.result())
+            self._spawn(self._finish(history_id, job_id, "done"))
+
+    async def _finish(
+        self, history_id: UUID, job_id: UUID, status: str, error: str | None = None
+    ):
+        async with TrainingJobRepo(write_timeout=None) as repo:
+            job = await repo.get_by_id(job_id)
+            if job is not None:
+                job.finish(status, error)
+            if status != "done":
+                # stopped trainings can be resumed later from their checkpoint
+                await TrainingHistoryRepo(repo.session).mark_interrupted(history_id)
+            await repo.commit()
+        remove_old_checkpoints()
+        await self.dispatch()
+
+    def sweep(self, sweep_id: UUID, params: SweepParams, trials: list[dict[str, Any]]):
+        self._spawn(self._run_sweep(sweep_id, params, trials))
+
+    async def _run_sweep(
+        self, sweep_id: UUID, params: SweepParams, trials: list[dict[str, Any]]
+    ):
+        logger = getLogger("training")
+        try:
+            async with DatasetRepo(read_only=True) as repo:
+                dataset = await repo.get_by_id(params.dataset_id)
+                if dataset is None:
+                    raise ValueError(
+                        f"No dataset found with the id {params.dataset_id}!"
+                    )
+                snapshot, _ = await build_snapshot(
+                    DatasetDataRepo(repo.session), dataset.id
+                )
+
+            split_seed = params.seed if params.seed is not None else getrandbits(62)
+            loop = get_running_loop()
+
+            async def run_trial(index: int, trial: dict[str, Any]):
+                training_params = TrainingParams(
+                    dataset_id=params.dataset_id,
+                    model_id=None,
+                    epochs=params.epochs,
+                    patience=params.patience,
+                    min_delta=params.min_delta,
+                    scheduler=params.scheduler,
+                    plateau_patience=params.plateau_patience,
+                    **trial,
+                )
+                await self._acquire_slot()
+                try:
+                    train_losses, validation_losses = await loop.run_in_executor(
+                        self._get_pool(),
+                        run_sweep_trial,
+                        snapshot,
+                        split_seed,
+                        training_params,
+                        trial_path(sweep_id, index),
+                    )
+                    best = validation_losses.index(min(validation_losses))
+                    trial["epochs"] = len(validation_losses)
+                    trial["train_loss"] = train_losses[best]
+                    trial["validation_loss"] = validation_losses[best]
+                except Exception as exc:
+                    logger.error(f"Sweep trial {index} failed!", exc_info=exc)
+                    if isinstance(exc, BrokenProcessPool):
+                        self._pool = None
+                    trial["error"] = str(exc)
+                finally:
+                    await self._release_slot()
+                await self._save_sweep(sweep_id, trials)
+
+            logger.info(f"Starting sweep {sweep_id} with {len(trials)} trials")
+            await gather(*(run_trial(i, trial) for i, trial in enumerate(trials)))
+
+            finished = [
+                (trial["validation_loss"], index)
+                for index, trial in enumerate(trials)
+                if trial.get("validation_loss") is not None
+            ]
+            if not finished:
+                raise ValueError("All the sweep trials failed!")
+            best_index = min(finished)[1]
+
+            model_id = uuid4()
+            model_path = MODELS_PATH / f"{model_id}.pth"
+            trial_path(sweep_id, best_index).replace(model_path)
+            export_npz(model_path)
+            ranked = sorted(
+                trials, key=lambda trial: trial.get("validation_loss", float("inf"))
+            )
+            async with SweepRepo(write_timeout=None) as repo:
+                sweep = await repo.get_by_id(sweep_id)
+                if sweep is not None:
+                    sweep.trials = ranked
+                    sweep.model_id = model_id
+                    sweep.finish("done")
+                repo.add(
+                    Model(
+                        id=model_id,
+                        description=f'Best model of the sweep "{sweep_id}"',
+                    )
+                )
+                await repo.commit()
+            logger.info(f"Sweep {sweep_id} finished, best model: {model_id}")
+        except Exception as exc:
+            logger.error("Sweep failed!", exc_info=exc)
+            async with SweepRepo(write_timeout=None) as repo:
+                sweep = await repo.get_by_id(sweep_id)
+                if sweep is not None:
+                    sweep.trials = trials
+                    sweep.finish("failed", str(exc))
+                await repo.commit()
+        finally:
+            remove_trials(sweep_id)
+
+    async def _save_sweep(self, sweep_id: UUID, trials: list[dict[str, Any]]):
+        async with SweepRepo(write_timeout=None) as repo:
+            sweep = await repo.get_by_id(sweep_id)
+            if sweep is not None:
+                sweep.trials = trials
+                await repo.commit()
+
+    async def recover(self):
+        # jobs left running by a previous process go back to the queue and
+        # continue from their last checkpoint
+        async with TrainingJobRepo(write_timeout=None) as repo:
+            await TrainingHistoryRepo(repo.session).mark_interrupted()
+            await repo.requeue_running()
+            await repo.finish_cancelling()
+            await SweepRepo(repo.session).fail_running("The api stopped mid sweep!")
+            await repo.commit()
+        remove_trials()
+        remove_old_checkpoints()
+        await self.dispatch()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+training_runner = TrainingRunner()
@@ -0,0 +1,101 @@
+from io import BytesIO
+from json import dumps, loads
+from typing import AsyncIterator
+
+import numpy as np
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.types import Receive, Scope, Send
+
+from src.contexts.model.entities import PredictColumns
+from src.utils import iter_lines
+
+FEATURES = ("lat", "long", "alt", "hour", "month", "day")
+NPY_MAGIC = b"\x93NUMPY"
+
+
+def columns_to_array(params: PredictColumns) -> np.ndarray:
+    array = np.empty((len(params.lat), len(FEATURES)), dtype=np.float32)
+    for index, feature in enumerate(FEATURES):
+        array[:, index] = getattr(params, feature)
+    return array
+
+
+def decode_array(body: bytes) -> tuple[np.ndarray, bool]:
+    is_npy = body.startswith(NPY_MAGIC)
+    if is_npy:
+        array = np.load(BytesIO(body), allow_pickle=False)
+    else:
+        if len(body) % (4 * len(FEATURES)) != 0:
+            raise ValueError(
+                f"Raw body must be little-endian float32 rows of {len(FEATURES)} values!"
+            )
+        array = np.frombuffer(bytearray(body), dtype="<f4")
+        array = array.reshape(-1, len(FEATURES))
+
+    if array.ndim != 2 or array.shape[1] != len(FEATURES):
+        raise ValueError(
+            f"Expected an array of shape (n, {len(FEATURES)}), got {array.shape}!"
+        )
+    return array.astype(np.float32, copy=False), is_npy
+
+
+def encode_array(preds: np.ndarray, as_npy: bool) -> bytes:
+    array = preds.reshape(-1).astype("<f4", copy=False)
+    if not as_npy:
+        return array.tobytes()
+
+    buffer = BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+async def iter_chunks(
+    stream: AsyncIterator[bytes], is_csv: bool, chunk_size: int
+) -> AsyncIterator[np.ndarray]:
+    lines = iter_lines(stream)
+    if is_csv:
+        header = await anext(lines, None)
+        if header is None:
+            return
+        names = [name.strip() for name in header.decode().split(",")]
+        missing = [feature for feature in FEATURES if feature not in names]
+        if missing:
+            raise ValueError(f"Missing CSV columns: {', '.join(missing)}!")
+        indexes = [names.index(feature) for feature in FEATURES]
+
+    rows: list[list[str]] | list[list[float]] = []
+    async for line in lines:
+        if is_csv:
+            values = line.decode().split(",")
+            rows.append([values[index] for index in indexes])  # type: ignore
+        else:
+            record = loads(line)
+            missing = [feature for feature in FEATURES if feature not in record]
+            if missing:
+                raise ValueError(f"Missing fields: {', '.join(missing)}!")
+            rows.append([record[feature] for feature in FEATURES])  # type: ignore
+        if len(rows) == chunk_size:
+            yield np.array(rows, dtype=np.float32)
+            rows = []
+    if rows:
+        yield np.array(rows, dtype=np.float32)
+
+
+def encode_ndjson(preds: np.ndarray) -> str:
+    return "".join(
+        dumps({"mean_temp": value}) + "\n" for value in preds.reshape(-1).tolist()
+    )
+
+
+def encode_event(event: str, data: BaseModel) -> str:
+    return f"event: {event}\ndata: {data.model_dump_json()}\n\n"
+
+
+class RequestStreamingResponse(StreamingResponse):
+    # the default one listens for disconnects on `receive`, which would swallow
+    # the request body chunks still being read by the streamed content
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,151 @@
+from asyncio import to_thread
+from json import dumps
+from typing import Annotated
+from uuid import UUID
+
+import numpy as np
+from fastapi import Query, Request
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRouter
+
+from src.constants import PREDICT_STREAM_CHUNK_SIZE
+from src.contexts.model.batching import batcher
+from src.contexts.model.entities import (
+    DEFAULT_ENGINE,
+    ENGINE_DESCRIPTION,
+    BatcherStats,
+    InferenceEngine,
+    Message,
+    Predict,
+    PredictColumns,
+    PredictColumnsResult,
+    RegistryStats,
+)
+from src.contexts.model.inputs import (
+    RequestStreamingResponse,
+    columns_to_array,
+    decode_array,
+    encode_array,
+    encode_ndjson,
+    iter_chunks,
+)
+from src.contexts.model.registry import registry
+
+router = APIRouter(prefix="/models", tags=["Model"])
+
+
+@router.get("/registry", response_model=RegistryStats)
+async def registry_stats():
+    return registry.stats()
+
+
+@router.get("/batcher", response_model=BatcherStats)
+async def batcher_stats():
+    return batcher.stats()
+
+
+@router.post("/predict", responses={404: {"model": Message}})
+async def predict(predict_params: Predict):
+    preds = await batcher.predict(
+        predict_params.model_id,
+        np.array(
+            [
+                [param.lat, param.long, param.alt, param.hour, param.month, param.day]
+                for param in predict_params.params
+            ],
+            dtype=np.float32,
+        ),
+        predict_params.engine,
+    )
+    return [{"mean_temp": pred} for pred in preds.squeeze(1).tolist()]
+
+
+@router.post(
+    "/predict/columnar",
+    response_model=PredictColumnsResult,
+    responses={404: {"model": Message}},
+)
+async def predict_columnar(predict_params: PredictColumns):
+    preds = await batcher.predict(
+        predict_params.model_id,
+        columns_to_array(predict_params),
+        predict_params.engine,
+    )
+    return JSONResponse(content={"mean_temp": preds.squeeze(1).tolist()})
+
+
+@router.post(
+    "/predict/binary",
+    response_class=Response,
+    responses={
+        200: {"content": {"application/octet-stream": {}}},
+        400: {"model": Message},
+        404: {"model": Message},
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/octet-stream": {
+                    "schema": {"type": "string", "format": "binary"}
+                }
+            },
+        }
+    },
+)
+async def predict_binary(
+    model_id: Annotated[UUID, Query()],
+    request: Request,
+    engine: Annotated[
+        InferenceEngine, Query(description=ENGINE_DESCRIPTION)
+    ] = DEFAULT_ENGINE,
+):
+    try:
+        data, is_npy = decode_array(await request.body())
+    except ValueError as exc:
+        return JSONResponse(status_code=400, content={"message": str(exc)})
+
+    preds = await batcher.predict(model_id, data, engine)
+    return Response(
+        content=encode_array(preds, is_npy), media_type="application/octet-stream"
+    )
+
+
+@router.post(
+    "/predict/stream",
+    response_class=RequestStreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}}},
+        404: {"model": Message},
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def predict_stream(
+    model_id: Annotated[UUID, Query()],
+    request: Request,
+    chunk_size: Annotated[int, Query(gt=0, le=65536)] = PREDICT_STREAM_CHUNK_SIZE,
+    engine: Annotated[
+        InferenceEngine, Query(description=ENGINE_DESCRIPTION)
+    ] = DEFAULT_ENGINE,
+):
+    # loaded before the response starts, so a missing model is still a 404
+    await to_thread(registry.get_engine, model_id, engine)
+    is_csv = request.headers.get("content-type", "").startswith("text/csv")
+
+    async def results():
+        try:
+            async for data in iter_chunks(request.stream(), is_csv, chunk_size):
+                preds = await to_thread(registry.predict, model_id, data, engine)
+                yield encode_ndjson(preds)
+        except (ValueError, IndexError, TypeError) as exc:
+            yield dumps({"error": str(exc)}) + "\n"
+
+    return RequestStreamingResponse(results(), media_type="application/x-ndjson")
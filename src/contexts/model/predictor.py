@@ -0,0 +1,45 @@
+from pathlib import Path
+from typing import Any
+
+from torch import Tensor, load, nn, save
+
+
+def build_net(hidden: int):
+    return nn.Sequential(
+        nn.Linear(6, hidden),
+        nn.ReLU(),
+        nn.Linear(hidden, hidden),
+        nn.ReLU(),
+        nn.Linear(hidden, 1),
+    )
+
+
+def read_hidden(path: Path) -> int:
+    # the file is only mapped, none of the weights are read
+    return load(path, weights_only=True, mmap=True)["net.0.weight"].shape[0]
+
+
+class TemperaturePredictor(nn.Module):
+    def __init__(self, hidden: int = 64):
+        super().__init__()
+
+        self.hidden = hidden
+        self.net = build_net(hidden)
+
+    def save(self, path: Path):
+        save(self.state_dict(), path)
+
+    def load_state(self, state: dict[str, Any]):
+        # models trained by a sweep may have a different width than the default
+        hidden = state["net.0.weight"].shape[0]
+        if hidden != self.hidden:
+            device = next(self.parameters()).device
+            self.hidden = hidden
+            self.net = build_net(hidden).to(device).train(self.training)
+        self.load_state_dict(state)
+
+    def load(self, path: Path):
+        self.load_state(load(path, weights_only=True))
+
+    def forward(self, x: Tensor) -> Tensor:
+        return self.net(x)
@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Callable, Literal, overload
+from uuid import UUID
+
+import numpy as np
+
+from src.constants import MODEL_REGISTRY_SIZE, MODELS_PATH
+from src.contexts.model.engines import (
+    NumpyPredictor,
+    build_engine,
+    engine_device,
+    export_npz,
+    npz_path,
+)
+from src.contexts.model.entities import DEFAULT_ENGINE, InferenceEngine
+
+if TYPE_CHECKING:
+    from src.contexts.model.predictor import TemperaturePredictor
+
+ModelKey = tuple[UUID, InferenceEngine]
+
+
+class ModelNotFoundError(Exception):
+    pass
+
+
+class ModelRegistry:
+    def __init__(self, max_size: int = MODEL_REGISTRY_SIZE, path: Path = MODELS_PATH):
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._models: OrderedDict[ModelKey, tuple[int, Callable[[Any], Any]]] = (
+            OrderedDict()
+        )
+        self._lock = Lock()
+
+    def _cached(self, key: ModelKey, mtime: int):
+        with self._lock:
+            cached = self._models.get(key)
+            if cached is not None and cached[0] == mtime:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        return None
+
+    def _store(self, key: ModelKey, mtime: int, model: Callable[[Any], Any]):
+        with self._lock:
+            self._models[key] = (mtime, model)
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_size:
+                self._models.popitem(last=False)
+                self.evictions += 1
+
+    def _load(self, file_path: Path) -> "TemperaturePredictor":
+        from src.contexts.model.predictor import TemperaturePredictor
+
+        model = TemperaturePredictor().to(engine_device("eager")).eval()
+        model.load(file_path)
+        return model
+
+    def _load_numpy(self, file_path: Path):
+        path = npz_path(file_path)
+        # models saved before the numpy engine existed are exported on first use
+        if not path.exists() or path.stat().st_mtime_ns < file_path.stat().st_mtime_ns:
+            export_npz(file_path)
+        return NumpyPredictor.load(path)
+
+    def get(self, model_id: UUID) -> "TemperaturePredictor":
+        return self.get_engine(model_id, "eager")
+
+    @overload
+    def get_engine(
+        self, model_id: UUID, engine: Literal["eager"]
+    ) -> "TemperaturePredictor": ...
+
+    @overload
+    def get_engine(
+        self, model_id: UUID, engine: InferenceEngine
+    ) -> Callable[[Any], Any]: ...
+
+    def get_engine(self, model_id: UUID, engine: InferenceEngine):
+        file_path = self.path / f"{model_id}.pth"
+        try:
+            mtime = file_path.stat().st_mtime_ns
+        except FileNotFoundError as exc:
+            raise ModelNotFoundError(f"Model with id {model_id} not found!") from exc
+        cached = self._cached((model_id, engine), mtime)
+        if cached is not None:
+            return cached
+
+        if engine == "numpy":
+            model = self._load_numpy(file_path)
+        elif engine == "eager":
+            model = self._load(file_path)
+        else:
+            # the variants are built from a private copy of the weights, so
+            # they don't share state with the cached eager model
+            model = build_engine(self._load(file_path), engine)
+        self._store((model_id, engine), mtime, model)
+        return model
+
+    def predict(
+        self, model_id: UUID, data: np.ndarray, engine: InferenceEngine = DEFAULT_ENGINE
+    ) -> np.ndarray:
+        model = self.get_engine(model_id, engine)
+        if engine == "numpy":
+            return model(data)
+
+        from torch import from_numpy, no_grad
+
+        with no_grad():
+            return model(from_numpy(data).to(engine_device(engine))).cpu().numpy()
+
+    def invalidate(self, model_id: UUID):
+        with self._lock:
+            for key in [key for key in self._models if key[0] == model_id]:
+                del self._models[key]
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._models),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+registry = ModelRegistry()
@@ -1,8 +1,16 @@
+from datetime import datetime, timezone
 from uuid import UUID
 
-from sqlalchemy import delete, select
+from sqlalchemy import delete, func, select, update
 
-from src.contexts.model.tables import Model, TrainingHistory
+from src.contexts.model.tables import (
+    Model,
+    ModelEvaluation,
+    Sweep,
+    TrainingEpoch,
+    TrainingHistory,
+    TrainingJob,
+)
 from src.database.repositories import BaseRepo
 
 
@@ -10,9 +18,108 @@ class TrainingHistoryRepo(BaseRepo[TrainingHistory]):
     async def list_all(self):
         return list(await self.session.scalars(select(TrainingHistory)))
 
-    async def get_ongoing(self):
+    async def get_by_id(self, id_: UUID):
+        return await self.session.scalar(
+            select(TrainingHistory).where(TrainingHistory.id == id_)
+        )
+
+    async def mark_interrupted(self, id_: UUID | None = None):
+        query = (
+            update(TrainingHistory)
+            .where(TrainingHistory.date_end.is_(None))
+            .values(interrupted=True)
+        )
+        if id_ is not None:
+            query = query.where(TrainingHistory.id == id_)
+        await self.session.execute(query)
+
+
+class TrainingEpochRepo(BaseRepo[TrainingEpoch]):
+    async def list_by_history_id(self, history_id: UUID, after_epoch: int = 0):
+        return list(
+            await self.session.scalars(
+                select(TrainingEpoch)
+                .where(
+                    TrainingEpoch.history_id == history_id,
+                    TrainingEpoch.epoch > after_epoch,
+                )
+                .order_by(TrainingEpoch.epoch)
+            )
+        )
+
+    async def delete_after(self, history_id: UUID, epoch: int):
+        await self.session.execute(
+            delete(TrainingEpoch).where(
+                TrainingEpoch.history_id == history_id, TrainingEpoch.epoch > epoch
+            )
+        )
+
+
+class TrainingJobRepo(BaseRepo[TrainingJob]):
+    async def list_all(self, status: str | None = None):
+        query = select(TrainingJob).order_by(TrainingJob.date_created)
+        if status is not None:
+            query = query.where(TrainingJob.status == status)
+        return list(await self.session.scalars(query))
+
+    async def get_by_id(self, id_: UUID):
+        return await self.session.scalar(
+            select(TrainingJob).where(TrainingJob.id == id_)
+        )
+
+    async def get_active_by_history_id(self, history_id: UUID):
+        return await self.session.scalar(
+            select(TrainingJob).where(
+                TrainingJob.history_id == history_id,
+                TrainingJob.status.in_(("queued", "running", "cancelling")),
+            )
+        )
+
+    async def get_next_queued(self):
+        return await self.session.scalar(
+            select(TrainingJob)
+            .where(TrainingJob.status == "queued")
+            .order_by(TrainingJob.priority.desc(), TrainingJob.date_created)
+            .limit(1)
+        )
+
+    async def count_running(self):
+        # a cancelled job keeps its worker until the training actually stops
         return await self.session.scalar(
-            select(TrainingHistory).where(TrainingHistory.date_end.is_(None))
+            select(func.count()).where(
+                TrainingJob.status.in_(("running", "cancelling"))
+            )
+        )
+
+    async def requeue_running(self):
+        await self.session.execute(
+            update(TrainingJob)
+            .where(TrainingJob.status == "running")
+            .values(status="queued", date_start=None)
+        )
+
+    async def finish_cancelling(self):
+        await self.session.execute(
+            update(TrainingJob)
+            .where(TrainingJob.status == "cancelling")
+            .values(status="cancelled", date_end=datetime.now(timezone.utc))
+        )
+
+
+class SweepRepo(BaseRepo[Sweep]):
+    async def list_all(self):
+        return list(
+            await self.session.scalars(select(Sweep).order_by(Sweep.date_start))
+        )
+
+    async def get_by_id(self, id_: UUID):
+        return await self.session.scalar(select(Sweep).where(Sweep.id == id_))
+
+    async def fail_running(self, error: str):
+        await self.session.execute(
+            update(Sweep)
+            .where(Sweep.status == "running")
+            .values(status="failed", error=error, date_end=datetime.now(timezone.utc))
         )
 
 
@@ -24,4 +131,29 @@ class ModelRepo(BaseRepo[Model]):
         return await self.session.scalar(select(Model).where(Model.id == id_))
 
     async def delete(self, id_: UUID):
+        await self.session.execute(
+            delete(ModelEvaluation).where(ModelEvaluation.model_id == id_)
+        )
         await self.session.execute(delete(Model).where(Model.id == id_))
+
+
+class ModelEvaluationRepo(BaseRepo[ModelEvaluation]):
+    async def get(
+        self, model_id: UUID, dataset_id: UUID, data_version: int, model_version: int
+    ):
+        return await self.session.scalar(
+            select(ModelEvaluation).where(
+                ModelEvaluation.model_id == model_id,
+                ModelEvaluation.dataset_id == dataset_id,
+                ModelEvaluation.data_version == data_version,
+                ModelEvaluation.model_version == model_version,
+            )
+        )
+
+    async def delete_by_model_and_dataset(self, model_id: UUID, dataset_id: UUID):
+        await self.session.execute(
+            delete(ModelEvaluation).where(
+                ModelEvaluation.model_id == model_id,
+                ModelEvaluation.dataset_id == dataset_id,
+            )
+        )
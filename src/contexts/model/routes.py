@@ -1,32 +1,53 @@
-from asyncio import get_event_loop
+from asyncio import sleep, to_thread
 from logging import getLogger
-from uuid import UUID
+from typing import Annotated
+from uuid import UUID, uuid4
 
-from fastapi.responses import JSONResponse
+from fastapi import Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.routing import APIRouter
-from torch import Tensor
 
-from src.constants import DEVICE, MODELS_PATH
-from src.contexts.dataset.repositories import DatasetDataRepo
-from src.contexts.model import TemperaturePredictor
+from src.constants import MODELS_PATH, TRAINING_EVENTS_POLL_SECONDS
+from src.contexts.dataset.repositories import DatasetStatsRepo
 from src.contexts.model.entities import (
+    MAX_SWEEP_TRIALS,
+    EngineParity,
+    EvaluationModel,
+    JobStatus,
     Message,
     Model,
-    Predict,
+    SweepModel,
+    SweepParams,
+    TrainingEpochModel,
     TrainingHistoryModel,
+    TrainingJobModel,
     TrainingParams,
     UpdateModelParams,
 )
-from src.contexts.model.executors import train_model
-from src.contexts.model.repositories import ModelRepo, TrainingHistoryRepo
-from src.contexts.model.tables import TrainingHistory
+from src.contexts.model.evaluation import check_engines, evaluate_model
+from src.contexts.model.executors import (
+    count_trials,
+    sample_trials,
+    training_runner,
+)
+from src.contexts.model.inputs import encode_event
+from src.contexts.model.predictor import read_hidden
+from src.contexts.model.registry import ModelNotFoundError, registry
+from src.contexts.model.repositories import (
+    ModelRepo,
+    SweepRepo,
+    TrainingEpochRepo,
+    TrainingHistoryRepo,
+    TrainingJobRepo,
+)
+from src.contexts.model.tables import Sweep, TrainingHistory
 
 router = APIRouter(prefix="/models", tags=["Model"])
 
 
 @router.get("", response_model=list[Model])
 async def list_models():
-    async with ModelRepo() as repo:
+    async with ModelRepo(read_only=True) as repo:
         models = await repo.list_all()
 
     return [model.to_dict() for model in models]
@@ -37,6 +58,7 @@ async def delete(id: UUID):
     async with ModelRepo() as repo:
         await repo.delete(id)
         await repo.commit()
+    registry.invalidate(id)
 
 
 @router.patch("/{id}", response_model=Model)
@@ -53,30 +75,74 @@ async def update(id: UUID, params: UpdateModelParams):
     return model.to_dict()
 
 
+@router.get(
+    "/{id}/evaluate",
+    response_model=EvaluationModel,
+    responses={404: {"model": Message}, 406: {"model": Message}},
+)
+async def evaluate(id: UUID, dataset_id: UUID):
+    try:
+        evaluation = await evaluate_model(id, dataset_id)
+    except ValueError as exc:
+        return JSONResponse(status_code=406, content={"message": str(exc)})
+    if evaluation is None:
+        return JSONResponse(
+            status_code=404,
+            content={"message": f"Model {id} or dataset {dataset_id} not found!"},
+        )
+    return evaluation
+
+
+@router.get(
+    "/{id}/parity",
+    response_model=list[EngineParity],
+    responses={404: {"model": Message}, 406: {"model": Message}},
+)
+async def parity(
+    id: UUID,
+    dataset_id: UUID,
+    rows: Annotated[int, Query(gt=0, le=65536)] = 1024,
+):
+    try:
+        results = await check_engines(id, dataset_id, rows)
+    except ValueError as exc:
+        return JSONResponse(status_code=406, content={"message": str(exc)})
+    if results is None:
+        return JSONResponse(
+            status_code=404,
+            content={"message": f"Model {id} or dataset {dataset_id} not found!"},
+        )
+    return results
+
+
 @router.post(
     "/train",
-    response_model=TrainingHistoryModel,
-    responses={406: {"model": Message}},
+    response_model=TrainingJobModel,
+    responses={404: {"model": Message}, 406: {"model": Message}},
     status_code=201,
 )
-async def train(params: TrainingParams):
-    async with TrainingHistoryRepo() as repo:
-        if await repo.get_ongoing() is not None:
-            return JSONResponse(
-                status_code=406, content={"message": "Model already training!"}
-            )
-        dataset_data_repo = DatasetDataRepo(repo.session)
-        amount_of_data = await dataset_data_repo.count_all_dataset_data(
-            params.dataset_id
+async def train(params: TrainingParams, priority: int = 0):
+    async with DatasetStatsRepo(read_only=True) as stats_repo:
+        stats = await stats_repo.get_or_build(params.dataset_id)
+    amount_of_data = stats.count
+    if amount_of_data < 5:
+        return JSONResponse(
+            status_code=406,
+            content={
+                "message": f"Not enough samples in the dataset! {amount_of_data} out of 5 required!"
+            },
         )
-        if amount_of_data is not None and amount_of_data < 5:
-            return JSONResponse(
-                status_code=406,
-                content={
-                    "message": f"Not enough samples in the dataset! {amount_of_data} out of 5 required!"
-                },
-            )
-        history = TrainingHistory()
+
+    if params.model_id is not None:
+        model_path = MODELS_PATH / f"{params.model_id}.pth"
+        if not model_path.exists():
+            raise ModelNotFoundError(f"Model with id {params.model_id} not found!")
+        # a fine-tuning keeps the width of the model it starts from, the history
+        # records the one actually trained
+        params.hidden = await to_thread(read_hidden, model_path)
+
+    async with TrainingHistoryRepo() as repo:
+        history = TrainingHistory(model_id=uuid4(), params=params.model_dump_json())
         repo.add(history)
         await repo.commit()
         await repo.session.refresh(history)
@@ -88,31 +154,182 @@ async def train(params: TrainingParams):
     )
     logger = getLogger("training")
     logger.info(
-        f'Invoking training of {logging_msg} using the dataset of id [red]"{params.dataset_id}"[/]',
+        f'Queueing training of {logging_msg} using the dataset of id [red]"{params.dataset_id}"[/]',
+        extra={"markup": True},
+    )
+    job = await training_runner.enqueue(history.id, priority)
+    return job.to_dict()
+
+
+@router.post(
+    "/sweep",
+    response_model=SweepModel,
+    responses={406: {"model": Message}},
+    status_code=201,
+)
+async def sweep(params: SweepParams):
+    amount_of_trials = count_trials(params)
+    if amount_of_trials > MAX_SWEEP_TRIALS:
+        return JSONResponse(
+            status_code=406,
+            content={
+                "message": f"The search space has {amount_of_trials} combinations, at most {MAX_SWEEP_TRIALS} are allowed!"
+            },
+        )
+    async with DatasetStatsRepo(read_only=True) as stats_repo:
+        stats = await stats_repo.get_or_build(params.dataset_id)
+    amount_of_data = stats.count
+    if amount_of_data < 5:
+        return JSONResponse(
+            status_code=406,
+            content={
+                "message": f"Not enough samples in the dataset! {amount_of_data} out of 5 required!"
+            },
+        )
+
+    async with SweepRepo() as repo:
+        trials = sample_trials(params)
+        sweep = Sweep(dataset_id=params.dataset_id, params=params.model_dump_json())
+        sweep.trials = trials
+        repo.add(sweep)
+        await repo.commit()
+        await repo.session.refresh(sweep)
+
+    getLogger("training").info(
+        f'Queueing a sweep of {len(trials)} trials using the dataset of id [red]"{params.dataset_id}"[/]',
         extra={"markup": True},
     )
-    get_event_loop().create_task(train_model(logger, params))
-    return history.to_dict()
+    training_runner.sweep(sweep.id, params, trials)
+    return sweep.to_dict()
+
+
+@router.get("/sweeps", response_model=list[SweepModel])
+async def list_sweeps():
+    async with SweepRepo(read_only=True) as repo:
+        sweeps = await repo.list_all()
+    return [sweep.to_dict() for sweep in sweeps]
+
+
+@router.get("/sweeps/{id}", response_model=SweepModel)
+async def get_sweep(id: UUID):
+    async with SweepRepo(read_only=True) as repo:
+        sweep = await repo.get_by_id(id)
+    if sweep is None:
+        raise ValueError(f"Sweep with id {id} not found!")
+    return sweep.to_dict()
 
 
 @router.get("/training-history", response_model=list[TrainingHistoryModel])
 async def training_history():
-    async with TrainingHistoryRepo() as repo:
+    async with TrainingHistoryRepo(read_only=True) as repo:
         trainings_history = await repo.list_all()
     return list(map(lambda t_h: t_h.to_dict(), trainings_history))
 
 
-@router.post("/predict")
-async def predict(predict_params: Predict):
-    model = TemperaturePredictor().to(DEVICE).eval()
-    model.load(MODELS_PATH / f"{predict_params.model_id}.pth")
+@router.get("/training-history/{id}/epochs", response_model=list[TrainingEpochModel])
+async def training_epochs(id: UUID):
+    async with TrainingEpochRepo(read_only=True) as repo:
+        epochs = await repo.list_by_history_id(id)
+    return [epoch.to_dict() for epoch in epochs]
+
+
+@router.get(
+    "/training-history/{id}/events",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}, 404: {"model": Message}},
+)
+async def training_events(id: UUID):
+    async with TrainingHistoryRepo(read_only=True) as repo:
+        if await repo.get_by_id(id) is None:
+            return JSONResponse(
+                status_code=404,
+                content={"message": f"Training history with id {id} not found!"},
+            )
+
+    async def events():
+        last_epoch = 0
+        while True:
+            async with TrainingEpochRepo(read_only=True) as repo:
+                epochs = await repo.list_by_history_id(id, last_epoch)
+                history = await TrainingHistoryRepo(repo.session).get_by_id(id)
+            for epoch in epochs:
+                last_epoch = epoch.epoch
+                yield encode_event("epoch", TrainingEpochModel(**epoch.to_dict()))
+            if history is None or history.date_end is not None or history.interrupted:
+                if history is not None:
+                    yield encode_event("end", TrainingHistoryModel(**history.to_dict()))
+                return
+            await sleep(TRAINING_EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@router.post(
+    "/training-history/{id}/resume",
+    response_model=TrainingJobModel,
+    responses={406: {"model": Message}},
+    status_code=201,
+)
+async def resume_training(id: UUID, priority: int = 0):
+    async with TrainingHistoryRepo(read_only=True) as repo:
+        history = await repo.get_by_id(id)
+        if history is None:
+            raise ValueError(f"Training history with id {id} not found!")
+        if (
+            not history.interrupted
+            or history.params is None
+            or await TrainingJobRepo(repo.session).get_active_by_history_id(id)
+        ):
+            return JSONResponse(
+                status_code=406,
+                content={"message": "Only interrupted trainings can be resumed!"},
+            )
 
-    preds: Tensor = model(
-        Tensor(
-            [
-                [param.lat, param.long, param.alt, param.hour, param.month, param.day]
-                for param in predict_params.params
-            ]
-        ).to(DEVICE)
+    getLogger("training").info(
+        f'Queueing the training [red]"{id}"[/] to be resumed', extra={"markup": True}
     )
-    return [{"mean_temp": pred.detach().item()} for pred in preds]
+    job = await training_runner.enqueue(id, priority)
+    return job.to_dict()
+
+
+@router.get("/jobs", response_model=list[TrainingJobModel])
+async def list_jobs(status: JobStatus | None = None):
+    async with TrainingJobRepo(read_only=True) as repo:
+        jobs = await repo.list_all(status)
+    return [job.to_dict() for job in jobs]
+
+
+@router.get("/jobs/{id}", response_model=TrainingJobModel)
+async def get_job(id: UUID):
+    async with TrainingJobRepo(read_only=True) as repo:
+        job = await repo.get_by_id(id)
+    if job is None:
+        raise ValueError(f"Training job with id {id} not found!")
+    return job.to_dict()
+
+
+@router.post(
+    "/jobs/{id}/cancel",
+    response_model=TrainingJobModel,
+    responses={406: {"model": Message}},
+)
+async def cancel_job(id: UUID):
+    async with TrainingJobRepo() as repo:
+        job = await repo.get_by_id(id)
+        if job is None:
+            raise ValueError(f"Training job with id {id} not found!")
+        if job.status not in ("queued", "running", "cancelling"):
+            return JSONResponse(
+                status_code=406, content={"message": "Training job already finished!"}
+            )
+        if job.status == "queued":
+            job.finish("cancelled")
+            await TrainingHistoryRepo(repo.session).mark_interrupted(job.history_id)
+        elif job.status == "running":
+            # the worker stops it at the end of the current epoch, only then the
+            # job is cancelled and its worker is free for the next one
+            job.status = "cancelling"
+        await repo.commit()
+        await repo.session.refresh(job)
+
+    return job.to_dict()
@@ -1,10 +1,15 @@
 from datetime import datetime, timezone
+from json import dumps, loads
+from typing import Any
 from uuid import UUID
 
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from src.database.tables import UUIDTable
 
+RESIDUAL_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
 
 def convert_string_to_list(string: str):
     return list(map(float, string.split(",")))
@@ -23,6 +28,9 @@ class TrainingHistory(UUIDTable):
     date_end: Mapped[datetime | None]
     _epoch_train_losses: Mapped[str | None]
     _epoch_validation_losses: Mapped[str | None]
+    model_id: Mapped[UUID | None]
+    params: Mapped[str | None]
+    interrupted: Mapped[bool] = mapped_column(default=False, server_default="0")
 
     @property
     def epoch_train_losses(self):
@@ -40,13 +48,15 @@ class TrainingHistory(UUIDTable):
             else self._epoch_validation_losses
         )
 
-    def to_dict(self) -> dict[str, UUID | datetime | list[float] | None]:
+    def to_dict(self) -> dict[str, UUID | datetime | list[float] | bool | None]:
         return {
             "id": self.id,
             "date_start": self.date_start,
             "date_end": self.date_end,
             "epoch_train_losses": self.epoch_train_losses,
             "epoch_validation_losses": self.epoch_validation_losses,
+            "model_id": self.model_id,
+            "interrupted": self.interrupted,
         }
 
     def finish(self, train_loss: list[float], validation_loss: list[float]):
@@ -55,6 +65,158 @@ class TrainingHistory(UUIDTable):
         self._epoch_validation_losses = convert_list_to_string(validation_loss)
 
 
+class TrainingEpoch(UUIDTable):
+    __tablename__ = "trainings_epochs"
+
+    history_id: Mapped[UUID] = mapped_column(
+        ForeignKey("trainings_history.id"), index=True
+    )
+    epoch: Mapped[int]
+    date: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc))
+    train_loss: Mapped[float]
+    validation_loss: Mapped[float]
+    learning_rate: Mapped[float]
+    samples_per_second: Mapped[float]
+    data_seconds: Mapped[float]
+    compute_seconds: Mapped[float]
+    validation_seconds: Mapped[float]
+    checkpoint_seconds: Mapped[float]
+    peak_rss_mb: Mapped[float | None]
+
+    def to_dict(self) -> dict[str, UUID | datetime | int | float | None]:
+        return {
+            "history_id": self.history_id,
+            "epoch": self.epoch,
+            "date": self.date,
+            "train_loss": self.train_loss,
+            "validation_loss": self.validation_loss,
+            "learning_rate": self.learning_rate,
+            "samples_per_second": self.samples_per_second,
+            "data_seconds": self.data_seconds,
+            "compute_seconds": self.compute_seconds,
+            "validation_seconds": self.validation_seconds,
+            "checkpoint_seconds": self.checkpoint_seconds,
+            "peak_rss_mb": self.peak_rss_mb,
+        }
+
+
+class TrainingJob(UUIDTable):
+    __tablename__ = "trainings_jobs"
+
+    history_id: Mapped[UUID] = mapped_column(
+        ForeignKey("trainings_history.id"), index=True
+    )
+    status: Mapped[str] = mapped_column(default="queued", index=True)
+    priority: Mapped[int] = mapped_column(default=0)
+    date_created: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(timezone.utc)
+    )
+    date_start: Mapped[datetime | None]
+    date_end: Mapped[datetime | None]
+    error: Mapped[str | None]
+
+    def to_dict(self) -> dict[str, UUID | datetime | str | int | None]:
+        return {
+            "id": self.id,
+            "history_id": self.history_id,
+            "status": self.status,
+            "priority": self.priority,
+            "date_created": self.date_created,
+            "date_start": self.date_start,
+            "date_end": self.date_end,
+            "error": self.error,
+        }
+
+    def finish(self, status: str, error: str | None = None):
+        self.status = status
+        self.error = error
+        self.date_end = datetime.now(timezone.utc)
+
+
+class Sweep(UUIDTable):
+    __tablename__ = "sweeps"
+
+    dataset_id: Mapped[UUID]
+    status: Mapped[str] = mapped_column(default="running")
+    date_start: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(timezone.utc)
+    )
+    date_end: Mapped[datetime | None]
+    model_id: Mapped[UUID | None]
+    params: Mapped[str]
+    _trials: Mapped[str] = mapped_column(default="[]")
+    error: Mapped[str | None]
+
+    @property
+    def trials(self) -> list[dict[str, Any]]:
+        return loads(self._trials)
+
+    @trials.setter
+    def trials(self, trials: list[dict[str, Any]]):
+        self._trials = dumps(trials)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "dataset_id": self.dataset_id,
+            "status": self.status,
+            "date_start": self.date_start,
+            "date_end": self.date_end,
+            "model_id": self.model_id,
+            "trials": self.trials,
+            "error": self.error,
+        }
+
+    def finish(self, status: str, error: str | None = None):
+        self.status = status
+        self.error = error
+        self.date_end = datetime.now(timezone.utc)
+
+
+class ModelEvaluation(UUIDTable):
+    __tablename__ = "models_evaluations"
+    __table_args__ = (
+        Index("ix_models_evaluations_model_id_dataset_id", "model_id", "dataset_id"),
+    )
+
+    model_id: Mapped[UUID]
+    dataset_id: Mapped[UUID]
+    data_version: Mapped[int]
+    model_version: Mapped[int]
+    date: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc))
+    count: Mapped[int]
+    mse: Mapped[float]
+    mae: Mapped[float]
+    mape: Mapped[float]
+    _residual_percentiles: Mapped[str]
+
+    @property
+    def residual_percentiles(self):
+        return convert_string_to_list(self._residual_percentiles)
+
+    @residual_percentiles.setter
+    def residual_percentiles(self, percentiles: list[float]):
+        self._residual_percentiles = convert_list_to_string(percentiles)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "model_id": self.model_id,
+            "dataset_id": self.dataset_id,
+            "data_version": self.data_version,
+            "date": self.date,
+            "count": self.count,
+            "mse": self.mse,
+            "mae": self.mae,
+            "mape": self.mape,
+            "residual_percentiles": {
+                f"p{percentile}": value
+                for percentile, value in zip(
+                    RESIDUAL_PERCENTILES, self.residual_percentiles
+                )
+            },
+        }
+
+
 class Model(UUIDTable):
     __tablename__ = "models"
 
@@ -1,12 +1,107 @@
+from asyncio import AbstractEventLoop, Lock, get_running_loop, wait_for
 from uuid import uuid4
+from weakref import WeakKeyDictionary
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import Connection, event, inspect, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 
-from src.constants import MODELS_PATH
+from src.constants import (
+    DATABASE_FILE,
+    DATABASE_READ_POOL_SIZE,
+    DATABASE_WRITE_TIMEOUT_SECONDS,
+    MODELS_PATH,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_MMAP_SIZE,
+    SQLITE_SYNCHRONOUS,
+)
 from src.utils import is_uuid
 
-engine = create_async_engine("sqlite+aiosqlite:///database.db")
+
+class DatabaseBusyError(Exception):
+    pass
+
+
+def set_pragmas(engine: AsyncEngine, pragmas: dict[str, str | int]):
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    return engine
+
+
+def begin_on_read(engine: AsyncEngine):
+    # sqlite3 only opens a transaction before a write, so each select of a read
+    # session would see the latest commit; an explicit BEGIN gives the session a
+    # single view of the database until it ends
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def on_begin(conn: Connection):
+        conn.exec_driver_sql("BEGIN")
+
+    return engine
+
+
+READ_PRAGMAS = {
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": SQLITE_CACHE_SIZE,
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+}
+WRITE_PRAGMAS = {
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    "synchronous": SQLITE_SYNCHRONOUS,
+    **READ_PRAGMAS,
+}
+
+# sqlite only takes one writer at a time, so writes share a single connection
+engine = set_pragmas(
+    create_async_engine(
+        f"sqlite+aiosqlite:///{DATABASE_FILE}", pool_size=1, max_overflow=0
+    ),
+    WRITE_PRAGMAS,
+)
+read_engine = begin_on_read(
+    set_pragmas(
+        create_async_engine(
+            f"sqlite+aiosqlite:///file:{DATABASE_FILE}?mode=ro&uri=true",
+            pool_size=DATABASE_READ_POOL_SIZE,
+        ),
+        READ_PRAGMAS,
+    )
+)
 async_session = async_sessionmaker(engine, autoflush=True)
+read_session = async_sessionmaker(read_engine, autoflush=True)
+
+_write_locks: WeakKeyDictionary[AbstractEventLoop, Lock] = WeakKeyDictionary()
+
+
+def get_write_lock():
+    # a lock only works on the loop it was first used on, and the workers and
+    # scripts run a new loop for every call
+    return _write_locks.setdefault(get_running_loop(), Lock())
+
+
+async def acquire_write_lock(timeout: float | None = DATABASE_WRITE_TIMEOUT_SECONDS):
+    # the writers of this process wait for the connection in order, and give up
+    # after the timeout instead of piling up behind a long write
+    try:
+        await wait_for(get_write_lock().acquire(), timeout)
+    except TimeoutError as exc:
+        raise DatabaseBusyError(
+            "The database is busy with other writes, try again later!"
+        ) from exc
 
 
 def create_models_from_files(session: AsyncSession):
@@ -28,13 +123,50 @@ def create_models_from_files(session: AsyncSession):
     session.add_all(models)
 
 
+def add_missing_columns(conn: Connection):
+    from src.database.tables import Base
+
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            definition = f"{column.name} {column.type.compile(conn.dialect)}"
+            if column.server_default is not None:
+                definition += f" DEFAULT '{column.server_default.arg}'"  # type: ignore
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+
+
+def create_missing_indexes(conn: Connection):
+    from src.database.tables import Base
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
 async def create_tables():
-    from src.contexts.dataset.tables import Dataset, DatasetData
-    from src.contexts.model.tables import Model, TrainingHistory
+    from src.contexts.dataset.tables import (
+        Dataset,
+        DatasetData,
+        DatasetStation,
+        DatasetStats,
+    )
+    from src.contexts.model.tables import (
+        Model,
+        ModelEvaluation,
+        Sweep,
+        TrainingEpoch,
+        TrainingHistory,
+        TrainingJob,
+    )
     from src.database.tables import Base
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
+        await conn.run_sync(create_missing_indexes)
 
     async with async_session() as session:
         create_models_from_files(session)
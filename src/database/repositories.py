@@ -2,23 +2,43 @@ from typing import Sequence
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database import async_session
+from src.constants import DATABASE_WRITE_TIMEOUT_SECONDS
+from src.database import (
+    acquire_write_lock,
+    async_session,
+    get_write_lock,
+    read_session,
+)
 
 
 class BaseRepo[T]:
     session: AsyncSession
 
-    def __init__(self, session: AsyncSession | None = None):
+    def __init__(
+        self,
+        session: AsyncSession | None = None,
+        read_only: bool = False,
+        write_timeout: float | None = DATABASE_WRITE_TIMEOUT_SECONDS,
+    ):
+        self.read_only = read_only
+        self.write_timeout = write_timeout
         if session is not None:
             self.session = session
 
     async def __aenter__(self):
-        a_session = async_session()
-        self.session = a_session
+        if self.read_only:
+            self.session = read_session()
+        else:
+            await acquire_write_lock(self.write_timeout)
+            self.session = async_session()
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
-        await self.session.close()
+        try:
+            await self.session.close()
+        finally:
+            if not self.read_only:
+                get_write_lock().release()
 
     def add(self, instance: T):
         self.session.add(instance)
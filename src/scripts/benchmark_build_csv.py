@@ -0,0 +1,169 @@
+import sys
+from datetime import datetime
+from io import StringIO
+from os import cpu_count
+from pathlib import Path
+from random import Random
+from re import sub
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from polars import DataFrame, col, concat, datatypes, lit, read_csv, struct
+from polars import all as pl_all
+from rich.console import Console
+from rich.table import Table
+from typer import Typer
+
+sys.path.append(Path(__file__).parents[2].as_posix())
+from src.scripts.build_csv import process_stations
+from src.scripts.inmet import SCHEMA
+
+app = Typer()
+
+
+def format_number(value: float):
+    return f"{value:.1f}".replace(".", ",")
+
+
+def write_station(path: Path, hours: int, random: Random):
+    columns = ["Data", "Hora UTC", *SCHEMA, "RADIACAO GLOBAL (Kj/m²)"]
+    lines = [
+        "REGIAO:;CO\n",
+        "UF:;DF\n",
+        f"ESTACAO:;{path.stem}\n",
+        "CODIGO (WMO):;A000\n",
+        f"LATITUDE:;{format_number(random.uniform(-30, 0))}\n",
+        f"LONGITUDE:;{format_number(random.uniform(-60, -35))}\n",
+        f"ALTITUDE:;{format_number(random.uniform(0, 1200))}\n",
+        "DATA DE FUNDACAO:;07/05/00\n",
+        ";".join(columns) + ";\n",
+    ]
+    for hour in range(hours):
+        day, month = 1 + (hour // 24) % 28, 1 + (hour // (24 * 28)) % 12
+        values = [f"2024/{month:02d}/{day:02d}", f"{hour % 24:02d}00 UTC"]
+        for dtype in SCHEMA.values():
+            value = random.uniform(0, 100)
+            values.append(
+                str(int(value)) if dtype.is_integer() else format_number(value)
+            )
+        values.append(format_number(random.uniform(0, 3000)))
+        lines.append(";".join(values) + ";\n")
+
+    path.write_text("".join(lines), encoding="latin-1")
+
+
+# the per-row map_elements implementation build_csv replaced, kept as the baseline
+def convert_datetime(date: str, time_df: str, field: str):
+    time = list(time_df.split()[0])
+    hour = "".join(time[:2])
+    minute = "".join(time[2:])
+    dt = date + "T" + f"{hour}:{minute}:00Z"
+    return getattr(datetime.strptime(dt, "%Y/%m/%dT%H:%M:%SZ"), field)
+
+
+def get_temp_mean(min_: float, max_: float):
+    return sum([min_, max_]) / 2
+
+
+def load_data_original(file_path: Path):
+    with open(file_path, "r", encoding="latin-1") as f:
+        all_lines = f.readlines()
+    return all_lines[4:7], all_lines[8:]
+
+
+def build_csv_original(head: list[str], data: list[str]):
+    extra_columns = {
+        "LATITUDE": 0.0,
+        "LONGITUDE": 0.0,
+        "ALTITUDE": 0.0,
+    }
+    merge_columns = ("Data", "Hora UTC")
+    temp_columns = (
+        "TEMPERATURA MÁXIMA NA HORA ANT. (AUT) (°C)",
+        "TEMPERATURA MÍNIMA NA HORA ANT. (AUT) (°C)",
+    )
+
+    for h in head:
+        key, h_value = h.split(":")
+        h_value = h_value[1:-1]
+        extra_columns[key] = float(sub(r",", ".", h_value))
+
+    df = read_csv(
+        StringIO("".join(data)),
+        encoding="latin-1",
+        separator=";",
+        decimal_comma=True,
+        infer_schema=False,
+    )
+    df = df.drop("RADIACAO GLOBAL (Kj/m²)", "")
+    df = df.drop_nulls()
+    df = df.select(pl_all().map_elements(lambda x: sub(r",", ".", x)))
+    for key, e_value in extra_columns.items():
+        df = df.with_columns(lit(e_value).alias(key))
+
+    for field, alias in (("hour", "Hora"), ("month", "Mes"), ("day", "Dia")):
+        df = df.with_columns(
+            struct(*merge_columns)
+            .map_elements(
+                lambda x, field=field: convert_datetime(
+                    x["Data"], x["Hora UTC"], field
+                ),
+                datatypes.Int64,
+            )
+            .alias(alias)
+        )
+    for key, value in SCHEMA.items():
+        df = df.with_columns(col(key).cast(value))
+    df = df.with_columns(
+        struct(*temp_columns)
+        .map_elements(
+            lambda x: get_temp_mean(x[temp_columns[1]], x[temp_columns[0]]),
+            datatypes.Float64,
+        )
+        .alias("temp_mean")
+    )
+    return df.drop(*merge_columns)
+
+
+def process_stations_serial(files: list[Path]):
+    df = DataFrame()
+    for file in files:
+        df = concat((df, build_csv_original(*load_data_original(file))))
+    return df
+
+
+@app.command()
+def main(stations: int = 64, hours: int = 8760, workers: int | None = None):
+    workers = workers or cpu_count() or 1
+    random = Random(0)
+    console = Console()
+
+    with TemporaryDirectory() as directory:
+        files = [Path(directory) / f"station_{i}.CSV" for i in range(stations)]
+        with console.status(f"Writing {stations} synthetic station files"):
+            for file in files:
+                write_station(file, hours, random)
+
+        runs = {
+            "serial, concat per file": lambda: process_stations_serial(files),
+            "serial, single concat": lambda: process_stations(files, workers=1),
+            f"{workers} workers, single concat": lambda: process_stations(
+                files, workers=workers
+            ),
+        }
+        table = Table("run", "rows", "seconds", "speedup")
+        baseline: float | None = None
+        for name, function in runs.items():
+            start = perf_counter()
+            df = function()
+            elapsed = perf_counter() - start
+            baseline = baseline or elapsed
+            table.add_row(
+                name, str(df.height), f"{elapsed:.2f}", f"{baseline / elapsed:.2f}x"
+            )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    app()
@@ -1,16 +1,23 @@
+import sys
 from asyncio import run
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from io import StringIO
+from functools import partial
+from multiprocessing import get_context
+from os import cpu_count
 from pathlib import Path
-from re import sub
+from typing import Annotated, Any, Callable
 from zipfile import ZipFile
 
 from aiofiles import open as aopen
+from click import Choice
 from httpx import AsyncClient
-from polars import DataFrame, col, concat, datatypes, lit, read_csv, struct
-from polars import all as pl_all
+from polars import DataFrame, concat
 from rich.progress import track
-from typer import Typer
+from typer import BadParameter, Option, Typer
+
+sys.path.append(Path(__file__).parents[2].as_posix())
+from src.scripts.inmet import process_member, process_station
 
 BASE_PATH = Path(__file__).parents[2] / "data"
 
@@ -18,24 +25,7 @@ IN_PATH = BASE_PATH / "in"
 OUT_PATH = BASE_PATH / "out"
 RAW_PATH = BASE_PATH / "raw"
 BASE_URL = "https://portal.inmet.gov.br"
-SCHEMA: dict[str, datatypes.DataTypeClass] = {
-    "PRECIPITAÇÃO TOTAL, HORÁRIO (mm)": datatypes.Float64,
-    "PRESSAO ATMOSFERICA AO NIVEL DA ESTACAO, HORARIA (mB)": datatypes.Float64,
-    "PRESSÃO ATMOSFERICA MAX.NA HORA ANT. (AUT) (mB)": datatypes.Float64,
-    "PRESSÃO ATMOSFERICA MIN. NA HORA ANT. (AUT) (mB)": datatypes.Float64,
-    "TEMPERATURA DO AR - BULBO SECO, HORARIA (°C)": datatypes.Float64,
-    "TEMPERATURA DO PONTO DE ORVALHO (°C)": datatypes.Float64,
-    "TEMPERATURA MÁXIMA NA HORA ANT. (AUT) (°C)": datatypes.Float64,
-    "TEMPERATURA MÍNIMA NA HORA ANT. (AUT) (°C)": datatypes.Float64,
-    "TEMPERATURA ORVALHO MAX. NA HORA ANT. (AUT) (°C)": datatypes.Float64,
-    "TEMPERATURA ORVALHO MIN. NA HORA ANT. (AUT) (°C)": datatypes.Float64,
-    "UMIDADE REL. MAX. NA HORA ANT. (AUT) (%)": datatypes.Int64,
-    "UMIDADE REL. MIN. NA HORA ANT. (AUT) (%)": datatypes.Int64,
-    "UMIDADE RELATIVA DO AR, HORARIA (%)": datatypes.Int64,
-    "VENTO, DIREÇÃO HORARIA (gr) (° (gr))": datatypes.Int64,
-    "VENTO, RAJADA MAXIMA (m/s)": datatypes.Float64,
-    "VENTO, VELOCIDADE HORARIA (m/s)": datatypes.Float64,
-}
+PARTITIONS = {"month": "Mes", "state": "UF"}
 
 app = Typer()
 
@@ -61,119 +51,83 @@ def unzip_file(file_path: Path, out_path: Path):
         f.extractall(out_path)
 
 
-def convert_datetime(date: str, time_df: str, field: str):
-    time = list(time_df.split()[0])
-    hour = "".join(time[:2])
-    minute = "".join(time[2:])
-    dt = date + "T" + f"{hour}:{minute}:00Z"
-    return getattr(datetime.strptime(dt, "%Y/%m/%dT%H:%M:%SZ"), field)
-
-
-def get_temp_mean(min_: float, max_: float):
-    return sum([min_, max_]) / 2
-
-
-async def load_data(file_path: Path):
-    async with aopen(file_path, "r") as f:
-        all_lines = await f.readlines()
-        head = all_lines[4:7]
-        data = all_lines[8:]
-    return head, data
-
-
-def build_csv(head: list[str], data: list[str]):
-    extra_columns = {
-        "LATITUDE": 0.0,
-        "LONGITUDE": 0.0,
-        "ALTITUDE": 0.0,
-    }
-    merge_columns = ("Data", "Hora UTC")
-    temp_columns = (
-        "TEMPERATURA MÁXIMA NA HORA ANT. (AUT) (°C)",
-        "TEMPERATURA MÍNIMA NA HORA ANT. (AUT) (°C)",
-    )
-
-    for h in head:
-        key, h_value = h.split(":")
-        h_value = h_value[1:-1]
-        extra_columns[key] = float(sub(r",", ".", h_value))
-
-    df = read_csv(
-        StringIO("".join(data)),
-        encoding="latin-1",
-        separator=";",
-        decimal_comma=True,
-        infer_schema=False,
-        # ignore_errors=True,
-    )
-    df = df.drop("RADIACAO GLOBAL (Kj/m²)", "")
-    df = df.drop_nulls()
-    df = df.select(pl_all().map_elements(lambda x: sub(r",", ".", x)))
-    for key, e_value in extra_columns.items():
-        df = df.with_columns(lit(e_value).alias(key))
-
-    df = df.with_columns(
-        struct(*merge_columns)
-        .map_elements(
-            lambda x: convert_datetime(x["Data"], x["Hora UTC"], "hour"),
-            datatypes.Int64,
-        )
-        .alias("Hora")
-    )
-    df = df.with_columns(
-        struct(*merge_columns)
-        .map_elements(
-            lambda x: convert_datetime(x["Data"], x["Hora UTC"], "month"),
-            datatypes.Int64,
-        )
-        .alias("Mes")
-    )
-    df = df.with_columns(
-        struct(*merge_columns)
-        .map_elements(
-            lambda x: convert_datetime(x["Data"], x["Hora UTC"], "day"), datatypes.Int64
-        )
-        .alias("Dia")
-    )
-    for key, value in SCHEMA.items():
-        df = df.with_columns(col(key).cast(value))
-    df = df.with_columns(
-        struct(*temp_columns)
-        .map_elements(
-            lambda x: get_temp_mean(
-                x["TEMPERATURA MÍNIMA NA HORA ANT. (AUT) (°C)"],
-                x["TEMPERATURA MÁXIMA NA HORA ANT. (AUT) (°C)"],
-            ),
-            datatypes.Float64,
-        )
-        .alias("temp_mean")
-    )
-    return df.drop(*merge_columns)
-
-
-async def download_and_process(year: int):
+async def download_and_process(
+    year: int,
+    workers: int | None = None,
+    extract: bool = False,
+    output_format: str = "parquet",
+    partition_by: list[str] | None = None,
+):
     await download_data_by_year(year)
-    file_csv = f"{year}.csv"
-    if (OUT_PATH / file_csv).exists():
+    out_file = OUT_PATH / (str(year) if partition_by else f"{year}.{output_format}")
+    if out_file.exists():
         print("File already created")
         return
     unpack_path = IN_PATH / str(year)
-    for path in (IN_PATH, OUT_PATH, RAW_PATH, unpack_path):
+    for path in (OUT_PATH, RAW_PATH):
         path.mkdir(parents=True, exist_ok=True)
     file_zip = f"{year}.zip"
-    unzip_file(RAW_PATH / file_zip, unpack_path)
-    df = DataFrame()
-    for file in track(list(unpack_path.iterdir())):
-        head, data = await load_data(file)
-        tmp = build_csv(head, data)
-        df = concat((df, tmp))
+    if extract:
+        unpack_path.mkdir(parents=True, exist_ok=True)
+        unzip_file(RAW_PATH / file_zip, unpack_path)
+        df = process_stations(list(unpack_path.iterdir()), workers)
+    else:
+        df = process_archive(RAW_PATH / file_zip, workers)
+
+    if output_format == "csv":
+        df.write_csv(out_file)
+    else:
+        df.write_parquet(
+            out_file,
+            compression="zstd",
+            partition_by=(
+                [PARTITIONS[partition] for partition in partition_by]
+                if partition_by
+                else None
+            ),
+        )
+
+
+def map_stations(
+    function: Callable[[Any], DataFrame], sources: list[Any], workers: int | None
+) -> DataFrame:
+    if workers == 1:
+        frames = [function(source) for source in track(sources)]
+    else:
+        # forking after polars started its thread pool can deadlock, so spawn
+        with ProcessPoolExecutor(
+            max_workers=workers or cpu_count(), mp_context=get_context("spawn")
+        ) as pool:
+            frames = list(track(pool.map(function, sources), total=len(sources)))
+
+    return concat(frames) if frames else DataFrame()
+
+
+def process_stations(files: list[Path], workers: int | None = None) -> DataFrame:
+    return map_stations(process_station, files, workers)
+
 
-    df.write_csv(OUT_PATH / file_csv)
+def process_archive(zip_path: Path, workers: int | None = None) -> DataFrame:
+    with ZipFile(zip_path, "r") as archive:
+        names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    return map_stations(partial(process_member, zip_path), names, workers)
 
 
 @app.command()
-def main(year: int):
-    run(download_and_process(year))
+def main(
+    year: int,
+    workers: int | None = None,
+    extract: bool = False,
+    output_format: Annotated[
+        str, Option("--format", click_type=Choice(["parquet", "csv"]))
+    ] = "parquet",
+    partition_by: Annotated[
+        list[str] | None, Option(click_type=Choice(list(PARTITIONS)))
+    ] = None,
+):
+    if partition_by and output_format != "parquet":
+        raise BadParameter("Only parquet outputs can be partitioned")
+    run(download_and_process(year, workers, extract, output_format, partition_by))
 
 
 if __name__ == "__main__":
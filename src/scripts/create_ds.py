@@ -1,55 +1,155 @@
 import sys
 from asyncio import run
 from pathlib import Path
-from uuid import uuid4
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from uuid import UUID, uuid4
 
-from polars import read_csv
-from rich.progress import track
+from polars import DataFrame, LazyFrame, concat, read_ipc, scan_csv, scan_parquet
+from rich.console import Console
+from rich.progress import BarColumn, Progress, TextColumn, TimeElapsedColumn
 from typer import Typer
 
 sys.path.append(Path(__file__).parents[2].as_posix())
-from src.contexts.dataset.repositories import DatasetDataRepo, DatasetRepo
-from src.contexts.dataset.tables import Dataset, DatasetData
-from src.database import create_tables
+from src.constants import DATASET_WRITE_CHUNK_SIZE
+from src.contexts.dataset.repositories import (
+    DatasetDataRepo,
+    DatasetRepo,
+    DatasetStatsRepo,
+)
+from src.contexts.dataset.tables import Dataset, DatasetStats
+from src.database import create_tables, engine, read_engine
 
 BASE_PATH = Path(__file__).parents[2] / "data"
 
 OUT_PATH = BASE_PATH / "out"
+CSV_COLUMNS = ["LATITUDE", "LONGITUDE", "ALTITUDE", "Hora", "Mes", "Dia", "temp_mean"]
 app = Typer()
 
 
-async def create_ds_with_data(year: int):
-    await create_tables()
-    params = read_csv(OUT_PATH / f"{year}.csv")
-    dataset = Dataset(id=uuid4())
-    dataset_data_list: list[DatasetData] = []
-    for row in track(params.rows(named=True)):
-        dataset_data_list.append(
-            DatasetData(
-                id=uuid4(),
-                dataset_id=dataset.id,
-                lat=row["LATITUDE"],
-                long=row["LONGITUDE"],
-                alt=row["ALTITUDE"],
-                hour=row["Hora"],
-                month=row["Mes"],
-                day=row["Dia"],
-                mean_temp=row["temp_mean"],
-            )
+def scan_year(year: int) -> LazyFrame:
+    if (OUT_PATH / f"{year}.parquet").exists():
+        return scan_parquet(OUT_PATH / f"{year}.parquet")
+    if (OUT_PATH / str(year)).is_dir():
+        return scan_parquet(
+            OUT_PATH / str(year) / "**" / "*.parquet", hive_partitioning=True
         )
+    if (OUT_PATH / f"{year}.csv").exists():
+        return scan_csv(OUT_PATH / f"{year}.csv")
+    raise FileNotFoundError(f"No built data found for {year}, run build_csv first!")
+
+
+def spool_years(years: list[int], path: Path) -> DataFrame:
+    # the sources are read in a single streaming pass, the batches are then
+    # sliced out of the memory-mapped file instead of scanning them again
+    concat([scan_year(year).select(CSV_COLUMNS) for year in years]).sink_ipc(path)
+    return read_ipc(path, memory_map=True, rechunk=False)
 
-    async with DatasetRepo() as repo:
-        dataset_data_repo = DatasetDataRepo(repo.session)
 
-        repo.add(dataset)
-        dataset_data_repo.add_all(dataset_data_list)
+async def get_or_create_dataset(dataset_id: UUID | None, years: list[int]):
+    async with DatasetRepo() as repo:
+        if dataset_id is not None:
+            if await repo.get_by_id(dataset_id) is None:
+                raise ValueError(f"No dataset found with the id {dataset_id}!")
+            return dataset_id
 
+        dataset_id = uuid4()
+        repo.add(
+            Dataset(
+                id=dataset_id,
+                description=f"INMET data from {', '.join(map(str, years))}",
+            )
+        )
+        DatasetStatsRepo(repo.session).add(DatasetStats.empty(dataset_id))
         await repo.commit()
+    return dataset_id
+
+
+async def load_data(
+    years: list[int],
+    dataset_id: UUID | None = None,
+    skip_rows: int = 0,
+    batch_size: int = 100_000,
+):
+    await create_tables()
+    dataset_id = await get_or_create_dataset(dataset_id, years)
+
+    # the memory map can still be open when it's removed on windows
+    with TemporaryDirectory(dir=OUT_PATH, ignore_cleanup_errors=True) as directory:
+        with Console().status(f"Reading {', '.join(map(str, years))}"):
+            frame = spool_years(years, Path(directory) / "rows.arrow")
+        await insert_frame(frame, years, dataset_id, skip_rows, batch_size)
+
+
+async def insert_frame(
+    frame: DataFrame,
+    years: list[int],
+    dataset_id: UUID,
+    skip_rows: int,
+    batch_size: int,
+):
+    loaded = 0
+    start = perf_counter()
+    with Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("{task.completed:,} rows"),
+        TextColumn("{task.fields[rate]:,.0f} rows/s"),
+        TimeElapsedColumn(),
+    ) as progress:
+        task = progress.add_task(
+            f"Loading {', '.join(map(str, years))}",
+            total=frame.height,
+            completed=skip_rows,
+            rate=0.0,
+        )
+        try:
+            for batch in frame.slice(skip_rows).iter_slices(batch_size):
+                data = batch.to_numpy()
+                async with DatasetDataRepo() as repo:
+                    await repo.bulk_insert(dataset_id, data, DATASET_WRITE_CHUNK_SIZE)
+                    await DatasetRepo(repo.session).bump_data_version(dataset_id)
+                    await DatasetStatsRepo(repo.session).apply(dataset_id, added=data)
+                    await repo.commit()
+
+                loaded += data.shape[0]
+                progress.update(
+                    task,
+                    advance=data.shape[0],
+                    rate=loaded / (perf_counter() - start),
+                )
+        except BaseException:
+            progress.console.print(
+                f"[red]Stopped after {loaded} rows[/], resume with "
+                f"--dataset-id {dataset_id} --skip-rows {skip_rows + loaded}"
+            )
+            raise
+
+    print(f"Loaded {loaded} rows into the dataset {dataset_id}")
+
+
+async def create_ds_with_data(
+    years: list[int],
+    dataset_id: UUID | None = None,
+    skip_rows: int = 0,
+    batch_size: int = 100_000,
+):
+    try:
+        await load_data(years, dataset_id, skip_rows, batch_size)
+    finally:
+        # the aiosqlite threads would keep the script alive after an error
+        await engine.dispose()
+        await read_engine.dispose()
 
 
 @app.command()
-def main(year: int):
-    run(create_ds_with_data(year))
+def main(
+    years: list[int],
+    dataset_id: UUID | None = None,
+    skip_rows: int = 0,
+    batch_size: int = 100_000,
+):
+    run(create_ds_with_data(years, dataset_id, skip_rows, batch_size))
 
 
 if __name__ == "__main__":
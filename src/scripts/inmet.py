@@ -0,0 +1,96 @@
+from pathlib import Path
+from typing import IO
+from zipfile import ZipFile
+
+from polars import DataFrame, col, datatypes, lit, read_csv
+from polars import all as pl_all
+
+HEADER_LINES = 8
+SCHEMA: dict[str, datatypes.DataTypeClass] = {
+    "PRECIPITAÇÃO TOTAL, HORÁRIO (mm)": datatypes.Float64,
+    "PRESSAO ATMOSFERICA AO NIVEL DA ESTACAO, HORARIA (mB)": datatypes.Float64,
+    "PRESSÃO ATMOSFERICA MAX.NA HORA ANT. (AUT) (mB)": datatypes.Float64,
+    "PRESSÃO ATMOSFERICA MIN. NA HORA ANT. (AUT) (mB)": datatypes.Float64,
+    "TEMPERATURA DO AR - BULBO SECO, HORARIA (°C)": datatypes.Float64,
+    "TEMPERATURA DO PONTO DE ORVALHO (°C)": datatypes.Float64,
+    "TEMPERATURA MÁXIMA NA HORA ANT. (AUT) (°C)": datatypes.Float64,
+    "TEMPERATURA MÍNIMA NA HORA ANT. (AUT) (°C)": datatypes.Float64,
+    "TEMPERATURA ORVALHO MAX. NA HORA ANT. (AUT) (°C)": datatypes.Float64,
+    "TEMPERATURA ORVALHO MIN. NA HORA ANT. (AUT) (°C)": datatypes.Float64,
+    "UMIDADE REL. MAX. NA HORA ANT. (AUT) (%)": datatypes.Int64,
+    "UMIDADE REL. MIN. NA HORA ANT. (AUT) (%)": datatypes.Int64,
+    "UMIDADE RELATIVA DO AR, HORARIA (%)": datatypes.Int64,
+    "VENTO, DIREÇÃO HORARIA (gr) (° (gr))": datatypes.Int64,
+    "VENTO, RAJADA MAXIMA (m/s)": datatypes.Float64,
+    "VENTO, VELOCIDADE HORARIA (m/s)": datatypes.Float64,
+}
+
+
+def read_station(stream: IO[bytes]):
+    head = [stream.readline().decode("latin-1") for _ in range(HEADER_LINES)]
+    return head, stream.read()
+
+
+def load_data(file_path: Path):
+    with open(file_path, "rb") as f:
+        return read_station(f)
+
+
+def build_csv(head: list[str], data: bytes):
+    extra_columns = {
+        "LATITUDE": 0.0,
+        "LONGITUDE": 0.0,
+        "ALTITUDE": 0.0,
+    }
+    merge_columns = ("Data", "Hora UTC")
+    temp_columns = (
+        "TEMPERATURA MÁXIMA NA HORA ANT. (AUT) (°C)",
+        "TEMPERATURA MÍNIMA NA HORA ANT. (AUT) (°C)",
+    )
+
+    for h in head[4:7]:
+        key, h_value = h.split(":")
+        h_value = h_value[1:-1]
+        extra_columns[key] = float(h_value.replace(",", "."))
+    state = head[1].split(":")[1].strip(" ;\r\n")
+
+    df = read_csv(
+        data,
+        encoding="latin-1",
+        separator=";",
+        decimal_comma=True,
+        infer_schema=False,
+        # ignore_errors=True,
+    ).lazy()
+    date_time = (col("Data") + " " + col("Hora UTC").str.slice(0, 4)).str.strptime(
+        datatypes.Datetime, "%Y/%m/%d %H%M"
+    )
+    df = (
+        df.drop("RADIACAO GLOBAL (Kj/m²)", "")
+        .drop_nulls()
+        .with_columns(pl_all().str.replace_all(",", ".", literal=True))
+        .with_columns(lit(e_value).alias(key) for key, e_value in extra_columns.items())
+        .with_columns(
+            date_time.dt.hour().cast(datatypes.Int64).alias("Hora"),
+            date_time.dt.month().cast(datatypes.Int64).alias("Mes"),
+            date_time.dt.day().cast(datatypes.Int64).alias("Dia"),
+        )
+        .with_columns(col(key).cast(value) for key, value in SCHEMA.items())
+        .with_columns(
+            ((col(temp_columns[0]) + col(temp_columns[1])) / 2).alias("temp_mean"),
+            lit(state).alias("UF"),
+        )
+        .drop(*merge_columns)
+    )
+    return df.collect()
+
+
+def process_station(file_path: Path) -> DataFrame:
+    head, data = load_data(file_path)
+    return build_csv(head, data)
+
+
+def process_member(zip_path: Path, name: str) -> DataFrame:
+    with ZipFile(zip_path, "r") as archive, archive.open(name) as stream:
+        head, data = read_station(stream)
+    return build_csv(head, data)
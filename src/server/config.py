@@ -1,39 +1,69 @@
-import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
-from rich.logging import RichHandler
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse
 
-from src.constants import ASSETS_PATH, MODELS_PATH
-from src.contexts.dataset.routes import router as dataset_router
-from src.contexts.model.routes import router as main_router
+from src.constants import (
+    ASSETS_PATH,
+    CHECKPOINTS_PATH,
+    DATASETS_PATH,
+    MODELS_PATH,
+    SERVING_MODE,
+)
+from src.contexts.model.predict_routes import router as predict_router
+from src.contexts.model.registry import ModelNotFoundError
+from src.utils import setup_logging
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    from src.database import create_tables
+    from src.contexts.model.batching import batcher
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(message)s",
-        datefmt="[%X]",
-        handlers=[RichHandler()],
-    )
-    for path in (ASSETS_PATH, MODELS_PATH):
+    setup_logging()
+    for path in (ASSETS_PATH, MODELS_PATH, DATASETS_PATH, CHECKPOINTS_PATH):
         path.mkdir(exist_ok=True, parents=True)
 
+    # prediction only replicas leave the database and the trainings to the
+    # full api, so they never import torch for the default engine
+    if SERVING_MODE == "predict":
+        yield
+        await batcher.close()
+        return
+
+    from src.contexts.model.executors import training_runner
+    from src.database import create_tables
+
     await create_tables()
+    await training_runner.recover()
     yield
+    await batcher.close()
+    training_runner.shutdown()
 
 
 app = FastAPI(lifespan=lifespan)
 
 
+@app.exception_handler(ModelNotFoundError)
+async def model_not_found(request: Request, exc: ModelNotFoundError):
+    return JSONResponse(status_code=404, content={"message": str(exc)})
+
+
 @app.get("/")
 def home():
     return RedirectResponse("/docs")
 
 
-app.include_router(main_router, prefix="/api")
-app.include_router(dataset_router, prefix="/api")
+app.include_router(predict_router, prefix="/api")
+if SERVING_MODE != "predict":
+    from src.contexts.dataset.routes import router as dataset_router
+    from src.contexts.model.routes import router as main_router
+    from src.database import DatabaseBusyError
+
+    @app.exception_handler(DatabaseBusyError)
+    async def database_busy(request: Request, exc: DatabaseBusyError):
+        return JSONResponse(
+            status_code=503, content={"message": str(exc)}, headers={"Retry-After": "1"}
+        )
+
+    app.include_router(main_router, prefix="/api")
+    app.include_router(dataset_router, prefix="/api")
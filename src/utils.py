@@ -1,5 +1,30 @@
+import logging
+import sys
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from typing import AsyncIterator
 from uuid import UUID
 
+from rich.logging import RichHandler
+
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        datefmt="[%X]",
+        handlers=[RichHandler()],
+    )
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        from resource import RUSAGE_SELF, getrusage
+    except ImportError:  # not available on windows
+        return None
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
 
 def is_uuid(string: str):
     try:
@@ -7,3 +32,26 @@ def is_uuid(string: str):
     except ValueError:
         return False
     return str(uuid_obj) == string
+
+
+def encode_cursor(id_: UUID):
+    return urlsafe_b64encode(id_.bytes).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        return UUID(bytes=urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (BinasciiError, ValueError) as exc:
+        raise ValueError(f"Invalid cursor {cursor!r}!") from exc
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer